@@ -0,0 +1,360 @@
+"""
+Write-behind recording of usage analytics (command usage, search history)
+"""
+import asyncio
+import datetime
+import logging
+import time
+from collections import defaultdict
+
+from sqlalchemy import func, insert, select
+
+import db_handler
+from db_handler import run_in_db_executor
+from models import (
+    CommandUsage, CommandUsageHourly, CommandUsageDaily, SearchHistory, SearchUsageDaily, RollupState,
+    Guild, User,
+)
+
+logger = logging.getLogger(__name__)
+
+class UsageRecorder:
+    """Buffers analytics rows in memory and writes them to the database in batches
+
+    record() never awaits or touches the database, so analytics adds no
+    latency to commands. Rows are flushed with one bulk insert per model
+    every batch_size rows or flush_interval seconds, whichever comes first.
+    When the queue is full new rows are dropped and counted instead of
+    applying backpressure to the caller.
+
+    The user and guild rows that user_id / guild_id reference are created
+    in the same transaction when missing. If a batch still fails, its rows
+    are retried one at a time so a single bad row only loses itself.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=5.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._batch_ready = asyncio.Event()
+        self._task = None
+        self._usernames = {}  # user_id -> name for user rows created at the next flush
+
+        # Backpressure / throughput metrics
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.high_water = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def enabled(self):
+        return db_handler.Session is not None
+
+    def start(self):
+        """Start the background flush task (call from a running event loop)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="usage-recorder")
+
+    async def stop(self):
+        """Stop the flush task and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def record(self, model, username=None, **row):
+        """Queue one row for model; returns False if it was dropped
+
+        username names the user row created if row's user_id is new.
+        """
+        if not self.enabled:
+            return False
+        try:
+            self._queue.put_nowait((model, row))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        if username is not None and "user_id" in row:
+            self._usernames[row["user_id"]] = username[:100]
+
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+        if depth >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything currently queued; returns the number of rows written"""
+        batches = defaultdict(list)
+        count = 0
+        while not self._queue.empty():
+            model, row = self._queue.get_nowait()
+            batches[model].append(row)
+            count += 1
+        if not count:
+            return 0
+
+        usernames, self._usernames = self._usernames, {}
+        start = time.perf_counter()
+        try:
+            written = await run_in_db_executor(self._write, dict(batches), usernames)
+        except Exception as e:
+            written = 0
+            logger.error(f"Failed to write {count} analytics rows: {e}")
+        self.written += written
+        self.failed += count - written
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        return written
+
+    def _write(self, batches, usernames):
+        """Insert batches in one transaction, falling back to row by row; returns rows written"""
+        session = db_handler.Session()
+        try:
+            try:
+                self._insert_parents(session, batches, usernames)
+                for model, rows in batches.items():
+                    session.execute(insert(model), rows)
+                session.commit()
+                return sum(len(rows) for rows in batches.values())
+            except Exception as e:
+                session.rollback()
+                logger.warning(f"Analytics batch failed ({e}); retrying row by row")
+
+            written = 0
+            for model, rows in batches.items():
+                for row in rows:
+                    try:
+                        self._insert_parents(session, {model: [row]}, usernames)
+                        session.execute(insert(model), [row])
+                        session.commit()
+                        written += 1
+                    except Exception as e:
+                        session.rollback()
+                        logger.error(f"Dropping analytics row for {model.__tablename__}: {e}")
+            return written
+        finally:
+            session.close()
+
+    def _insert_parents(self, session, batches, usernames):
+        """Create the missing user and guild rows the batch references"""
+        user_ids = {row["user_id"] for rows in batches.values() for row in rows if row.get("user_id") is not None}
+        guild_ids = {row["guild_id"] for rows in batches.values() for row in rows if row.get("guild_id") is not None}
+        parents = [
+            (User, [{"id": user_id, "username": usernames.get(user_id, str(user_id))} for user_id in user_ids]),
+            (Guild, [{"id": guild_id} for guild_id in guild_ids]),
+        ]
+        for model, rows in parents:
+            if not rows:
+                continue
+            table = model.__table__
+            if db_handler.upsert_insert is not None:
+                session.execute(db_handler.upsert_insert(table).on_conflict_do_nothing(index_elements=[table.c.id]), rows)
+                continue
+            existing = {row[0] for row in session.execute(select(table.c.id).where(table.c.id.in_([row["id"] for row in rows])))}
+            missing = [row for row in rows if row["id"] not in existing]
+            if missing:
+                session.execute(insert(table), missing)
+
+    def stats(self):
+        """Return queue depth and throughput counters"""
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "high_water": self.high_water,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+def _truncate(column, unit, dialect):
+    """SQL expression flooring a timestamp column to the start of its hour or day"""
+    if dialect == "postgresql":
+        return func.date_trunc(unit, column)
+    fmt = "%Y-%m-%d %H:00:00" if unit == "hour" else "%Y-%m-%d 00:00:00"
+    return func.strftime(fmt, column)
+
+def _as_datetime(value):
+    # SQLite hands back strftime() buckets as strings
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+def _floor(moment, unit):
+    if unit == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class UsageRollup:
+    """Aggregates raw usage rows into hourly/daily counters and prunes old raw rows
+
+    Each job keeps a watermark in RollupState and only ever processes
+    complete buckets older than it, so every raw row is counted exactly once
+    and rollup rows are plain inserts. A bucket is only rolled up once it
+    ended more than `grace` ago, which must exceed how long UsageRecorder
+    can hold a row before writing it, or late rows would be skipped. Stats queries read the compact rollup
+    tables instead of scanning raw history.
+
+    All methods are blocking; run them on the db executor.
+    """
+
+    def __init__(self, raw_retention_days=7, hourly_retention_days=30, grace_seconds=300):
+        self.raw_retention = datetime.timedelta(days=raw_retention_days)
+        self.hourly_retention = datetime.timedelta(days=hourly_retention_days)
+        self.grace = datetime.timedelta(seconds=grace_seconds)
+
+    @property
+    def enabled(self):
+        return db_handler.Session is not None
+
+    def run(self, now=None):
+        """Roll up every complete bucket and apply retention; returns rows written per job"""
+        if not self.enabled:
+            return {}
+        now = now or datetime.datetime.utcnow()
+        session = db_handler.Session()
+        try:
+            return {
+                "command_usage_hourly": self._rollup_command_usage_hourly(session, now),
+                "command_usage_daily": self._rollup_command_usage_daily(session, now),
+                "search_usage_daily": self._rollup_search_usage_daily(session, now),
+                "pruned": self._prune(session, now),
+            }
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _rollup(self, session, job, aggregate, time_column, unit, group_columns, target, now, limit=None):
+        """Aggregate source rows in [watermark, end) into target, then advance the watermark"""
+        end = _floor(now - self.grace, unit)
+        if limit is not None:
+            end = min(end, _floor(limit, unit))
+
+        state = session.get(RollupState, job)
+        if state is None:
+            first = session.query(func.min(time_column)).scalar()
+            if first is None:
+                return 0
+            state = RollupState(name=job, watermark=_floor(_as_datetime(first), unit))
+            session.add(state)
+        if state.watermark >= end:
+            session.commit()
+            return 0
+
+        bucket = _truncate(time_column, unit, session.get_bind().dialect.name).label("bucket")
+        query = (
+            session.query(bucket, *group_columns, aggregate.label("count"))
+            .filter(time_column >= state.watermark, time_column < end)
+            .group_by(bucket, *group_columns)
+        )
+        rows = [
+            {"bucket": _as_datetime(row.bucket), "count": row.count, **{
+                column.key: getattr(row, column.key) for column in group_columns
+            }}
+            for row in query
+        ]
+        if rows:
+            session.execute(insert(target), rows)
+        state.watermark = end
+        session.commit()
+        return len(rows)
+
+    def _rollup_command_usage_hourly(self, session, now):
+        return self._rollup(
+            session, "command_usage_hourly", func.count(CommandUsage.id), CommandUsage.used_at, "hour",
+            [func.coalesce(CommandUsage.guild_id, 0).label("guild_id"), CommandUsage.command_name],
+            CommandUsageHourly, now,
+        )
+
+    def _rollup_command_usage_daily(self, session, now):
+        # Only days whose hours have all been rolled up
+        hourly = session.get(RollupState, "command_usage_hourly")
+        if hourly is None:
+            return 0
+        return self._rollup(
+            session, "command_usage_daily", func.sum(CommandUsageHourly.count), CommandUsageHourly.bucket, "day",
+            [CommandUsageHourly.guild_id, CommandUsageHourly.command_name],
+            CommandUsageDaily, now, limit=hourly.watermark,
+        )
+
+    def _rollup_search_usage_daily(self, session, now):
+        return self._rollup(
+            session, "search_usage_daily", func.count(SearchHistory.id), SearchHistory.searched_at, "day",
+            [SearchHistory.search_type], SearchUsageDaily, now,
+        )
+
+    def _prune(self, session, now):
+        """Delete raw rows past retention (never ones that haven't been rolled up)"""
+        pruned = 0
+        targets = [
+            (CommandUsage, CommandUsage.used_at, "command_usage_hourly", self.raw_retention),
+            (SearchHistory, SearchHistory.searched_at, "search_usage_daily", self.raw_retention),
+            (CommandUsageHourly, CommandUsageHourly.bucket, "command_usage_daily", self.hourly_retention),
+        ]
+        for model, time_column, job, retention in targets:
+            state = session.get(RollupState, job)
+            if state is None:
+                continue
+            cutoff = min(now - retention, state.watermark)
+            pruned += session.query(model).filter(time_column < cutoff).delete(synchronize_session=False)
+        session.commit()
+        return pruned
+
+    def top_commands(self, guild_id, days=7, limit=10, now=None):
+        """Return [(command_name, count)] for a guild over the last days, from rollups"""
+        if not self.enabled:
+            return []
+        now = now or datetime.datetime.utcnow()
+        since = _floor(now - datetime.timedelta(days=days), "hour")
+        totals = defaultdict(int)
+        session = db_handler.Session()
+        try:
+            daily = session.get(RollupState, "command_usage_daily")
+            split = daily.watermark if daily else since
+            # A partial first day still has hourly detail unless it's past hourly retention
+            daily_start = _floor(since, "day")
+            if daily_start < since and since >= now - self.hourly_retention:
+                daily_start += datetime.timedelta(days=1)
+            # Whole days from the daily table, the edges from the hourly table
+            sources = [
+                (CommandUsageHourly, since, min(daily_start, split)),
+                (CommandUsageDaily, daily_start, split),
+                (CommandUsageHourly, max(since, split), now),
+            ]
+            for model, start, end in sources:
+                if start >= end:
+                    continue
+                query = (
+                    session.query(model.command_name, func.sum(model.count))
+                    .filter(model.guild_id == guild_id, model.bucket >= start, model.bucket < end)
+                    .group_by(model.command_name)
+                )
+                for name, count in query:
+                    totals[name] += count
+        finally:
+            session.close()
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
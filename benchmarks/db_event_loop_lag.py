@@ -0,0 +1,86 @@
+"""
+Event-loop lag under concurrent database load
+
+Runs the same burst of DatabaseHandler calls twice, once directly on the
+event loop (the old behaviour) and once through AsyncDatabaseHandler, while a
+ticker task measures how late the loop wakes it up. A fixed delay is added to
+every statement to stand in for a network round trip to Postgres.
+
+Usage:
+    python benchmarks/db_event_loop_lag.py [--calls 200] [--latency-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the handler at a throwaway SQLite database unless one is configured
+if "DATABASE_URL" not in os.environ:
+    _db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+from sqlalchemy import event
+
+import db_handler
+from db_handler import DatabaseHandler, AsyncDatabaseHandler
+
+TICK_INTERVAL = 0.005
+
+async def measure_lag(stop):
+    """Sample how late the event loop runs a task scheduled every TICK_INTERVAL"""
+    samples = []
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected) * 1000)
+    return samples
+
+async def blocking_workload(calls):
+    """Old behaviour: synchronous handler calls made straight from coroutines"""
+    async def one(i):
+        await asyncio.sleep(0)
+        DatabaseHandler.increment_warning(1, i % 50)
+    await asyncio.gather(*(one(i) for i in range(calls)))
+
+async def async_workload(calls):
+    """New behaviour: the same calls awaited through the db executor"""
+    await asyncio.gather(*(AsyncDatabaseHandler.increment_warning(1, i % 50) for i in range(calls)))
+
+async def run(name, workload, calls):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop))
+    start = time.perf_counter()
+    await workload(calls)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    samples = await ticker or [0.0]
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{name:<10} wall={elapsed:6.2f}s  lag mean={statistics.mean(samples):7.2f}ms  "
+        f"p99={p99:7.2f}ms  max={samples[-1]:7.2f}ms  samples={len(samples)}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="number of DB calls per run")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated per-statement round trip")
+    args = parser.parse_args()
+
+    if args.latency_ms > 0:
+        @event.listens_for(db_handler.engine, "before_cursor_execute")
+        def _simulate_round_trip(*_):
+            time.sleep(args.latency_ms / 1000)
+
+    print(f"{args.calls} calls, {args.latency_ms}ms simulated latency per statement")
+    asyncio.run(run("blocking", blocking_workload, args.calls))
+    asyncio.run(run("executor", async_workload, args.calls))
+
+if __name__ == "__main__":
+    main()
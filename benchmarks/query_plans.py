@@ -0,0 +1,130 @@
+"""
+Query-plan check for DatabaseHandler lookups
+
+Runs every keyed DatabaseHandler lookup against the configured database,
+captures the statements it actually issues with a before_cursor_execute
+hook, asks the database for each plan and fails if any of them falls back
+to a full table scan. Works against SQLite (EXPLAIN QUERY PLAN) and Postgres
+(EXPLAIN with sequential scans disabled, so a small table still reports
+whether an index is usable). tests/test_query_plans.py runs the same check.
+
+Usage:
+    python benchmarks/query_plans.py
+"""
+import contextlib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the handler at a throwaway SQLite database unless one is configured
+if "DATABASE_URL" not in os.environ:
+    _db_path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+from sqlalchemy import event
+
+import db_handler
+from db_handler import DatabaseHandler
+
+# Rows the benchmark creates; far from any real Discord id
+GUILD_ID = 900000000000000001
+OTHER_GUILD_ID = 900000000000000002
+ROLE_ID, CHANNEL_ID, USER_ID = 11, 12, 13
+
+# (description, call) for every keyed lookup in DatabaseHandler, in an order
+# where each one finds the rows the earlier ones created
+LOOKUPS = [
+    ("get_guild_settings", lambda: DatabaseHandler.get_guild_settings(GUILD_ID)),
+    ("update_guild_settings", lambda: DatabaseHandler.update_guild_settings(GUILD_ID, prefix="?")),
+    ("add_auto_role", lambda: DatabaseHandler.add_auto_role(GUILD_ID, ROLE_ID)),
+    ("get_auto_roles", lambda: DatabaseHandler.get_auto_roles(GUILD_ID)),
+    ("restrict_channel", lambda: DatabaseHandler.restrict_channel(GUILD_ID, CHANNEL_ID)),
+    ("get_restricted_channels", lambda: DatabaseHandler.get_restricted_channels(GUILD_ID)),
+    ("add_allowed_user", lambda: DatabaseHandler.add_allowed_user(GUILD_ID, CHANNEL_ID, USER_ID)),
+    ("add_custom_command", lambda: DatabaseHandler.add_custom_command(GUILD_ID, "bench", "ok")),
+    ("get_custom_commands", lambda: DatabaseHandler.get_custom_commands(GUILD_ID)),
+    ("remove_custom_command", lambda: DatabaseHandler.remove_custom_command(GUILD_ID, "bench")),
+    ("increment_warning", lambda: DatabaseHandler.increment_warning(GUILD_ID, USER_ID)),
+    ("warm_cache", lambda: DatabaseHandler.warm_cache([GUILD_ID, OTHER_GUILD_ID])),
+]
+
+# load_gif_index (run by warm_cache) reads every GIF by design
+FULL_LOAD_TABLES = {"anime_gifs"}
+
+@contextlib.contextmanager
+def capture_statements():
+    """Collect (statement, parameters) for everything executed on the handler's engines"""
+    statements = []
+    engines = {db_handler.engine, db_handler.read_engine}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", capture)
+
+def handler_statements():
+    """[(description, statement, parameters)] issued by each lookup on a cold cache"""
+    DatabaseHandler.clear_cache()
+    captured = []
+    for description, call in LOOKUPS:
+        DatabaseHandler.clear_cache(GUILD_ID)
+        with capture_statements() as statements:
+            call()
+        captured += [(description, statement, parameters) for statement, parameters in statements]
+    return captured
+
+def explain(conn, statement, parameters):
+    """Return the plan for statement as a single string"""
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        if conn.dialect.name == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return " | ".join(row[-1] for row in cursor.fetchall())
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        return " | ".join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+def full_scans(plan, dialect):
+    """The plan steps that read a whole table, other than FULL_LOAD_TABLES"""
+    steps = [step.strip() for step in plan.split("|")]
+    if dialect == "sqlite":
+        # "SEARCH ... USING INDEX" is an index lookup; "SCAN <table>" reads every row
+        scans = [step for step in steps if step.startswith("SCAN ")]
+    else:
+        scans = [step for step in steps if "Seq Scan" in step]
+    return [step for step in scans if not any(table in step.split() for table in FULL_LOAD_TABLES)]
+
+def check():
+    """[(description, statement, plan, full_scans)] for every captured statement"""
+    statements = handler_statements()
+    results = []
+    with db_handler.engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for description, statement, parameters in statements:
+            plan = explain(conn, statement, parameters)
+            results.append((description, statement, plan, full_scans(plan, conn.dialect.name)))
+    return results
+
+def main():
+    failures = 0
+    for description, statement, plan, scans in check():
+        failures += bool(scans)
+        summary = " ".join(statement.split())[:60]
+        print(f"{'❌' if scans else '✅'} {description:<24} {summary:<60} {plan or '(no table access)'}")
+    if failures:
+        print(f"{failures} statement(s) use a full scan")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
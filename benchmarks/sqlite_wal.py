@@ -0,0 +1,132 @@
+"""
+Concurrent reader/writer throughput on SQLite: default pragmas vs. the tuned profile
+
+Simulates the Flask dashboard (reader threads running aggregate queries) and
+the bot (a writer thread committing small batches of command usage rows)
+against the same database file, first with SQLite's defaults (rollback
+journal, synchronous=FULL) and then with db_handler.SQLITE_PRAGMAS applied.
+
+Both runs start from the same seeded rows, and readers only aggregate those
+(through an index on guild_id, used_at), so every read does the same work no
+matter how many rows the writer has added.
+
+Usage:
+    python benchmarks/sqlite_wal.py [--seconds 5] [--readers 4] [--seed-rows 50000]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the handler at a throwaway SQLite database unless one is configured
+if "DATABASE_URL" not in os.environ:
+    _db_path = os.path.join(tempfile.mkdtemp(), "handler.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.exc import OperationalError
+
+from db_handler import apply_sqlite_pragmas
+from models import CommandUsage
+
+GUILDS = 50
+COMMANDS = ["hug", "pat", "gif", "search", "weather", "help"]
+SEEDED_AT = datetime.datetime(2024, 1, 1)
+
+def seed(engine, table, rows):
+    """Insert a fixed dataset of rows, all older than anything the writer adds"""
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "user_id": i % 1000, "guild_id": i % GUILDS, "command_name": COMMANDS[i % len(COMMANDS)],
+            "used_at": SEEDED_AT + datetime.timedelta(seconds=i),
+        })
+        if len(batch) == 5000:
+            with engine.begin() as conn:
+                conn.execute(insert(table), batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(insert(table), batch)
+
+def run(name, tuned, seconds, readers, seed_rows):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", pool_size=readers + 2)
+    if tuned:
+        apply_sqlite_pragmas(engine)
+    table = CommandUsage.__table__
+    table.create(engine)
+    with engine.begin() as conn:
+        # Plain SQL, so the benchmark's index stays off the model
+        conn.execute(text("CREATE INDEX ix_bench_guild_used_at ON command_usage (guild_id, used_at)"))
+    seed(engine, table, seed_rows)
+    seeded_until = SEEDED_AT + datetime.timedelta(seconds=seed_rows)
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def bump(key, amount=1):
+        with lock:
+            counts[key] += amount
+
+    def writer():
+        batch = 0
+        while not stop.is_set():
+            rows = [
+                {"user_id": i, "guild_id": batch % GUILDS, "command_name": "hug", "used_at": datetime.datetime.utcnow()}
+                for i in range(10)
+            ]
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(table), rows)
+                bump("writes", len(rows))
+            except OperationalError:
+                bump("errors")
+            batch += 1
+
+    def reader():
+        query = (
+            select(table.c.command_name, func.count())
+            .where(table.c.guild_id == 7, table.c.used_at < seeded_until)
+            .group_by(table.c.command_name)
+        )
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(query).all()
+                bump("reads")
+            except OperationalError:
+                bump("errors")
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(
+        f"{name:<8} reads/s={counts['reads'] / seconds:9.1f}  "
+        f"rows written/s={counts['writes'] / seconds:9.1f}  lock errors={counts['errors']}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each run")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent reader threads")
+    parser.add_argument("--seed-rows", type=int, default=50000, help="rows inserted before each run")
+    args = parser.parse_args()
+
+    run("default", False, args.seconds, args.readers, args.seed_rows)
+    run("tuned", True, args.seconds, args.readers, args.seed_rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+In-memory caching helpers shared by the bot's data layer
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after a fixed TTL
+
+    Safe to use from both the event loop and the db executor threads.
+    Hit, miss, eviction and expiry counters are exposed through stats().
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries if full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove key and return its value (expired entries return default)"""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def keys(self):
+        """Return a list of the currently stored keys (may include expired ones)"""
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        entry = self._data.get(key, _MISSING)
+        return entry is not _MISSING and entry[0] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return a dict of size and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __repr__(self):
+        return f"<TTLCache name={self.name} size={len(self._data)}/{self.maxsize}>"
+
+
+class CategorySampler:
+    """Array-backed index of items per category with O(1) random sampling
+
+    Loaded once in bulk, then kept current with add() as new items are written.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.loaded = False
+        self._by_category = {}  # category -> list of items
+        self._all = []
+        self._lock = threading.Lock()
+
+    def load(self, pairs):
+        """Replace the index with (category, item) pairs"""
+        by_category = {}
+        all_items = []
+        for category, item in pairs:
+            by_category.setdefault(category, []).append(item)
+            all_items.append(item)
+        with self._lock:
+            self._by_category = by_category
+            self._all = all_items
+            self.loaded = True
+
+    def add(self, category, item):
+        """Append a single item to its category"""
+        with self._lock:
+            self._by_category.setdefault(category, []).append(item)
+            self._all.append(item)
+
+    def sample(self, category=None):
+        """Return a random item, optionally from one category, or None if empty"""
+        items = self._by_category.get(category) if category else self._all
+        if not items:
+            return None
+        return random.choice(items)
+
+    def categories(self):
+        """Return the known categories with their item counts"""
+        return {category: len(items) for category, items in self._by_category.items()}
+
+    def clear(self):
+        """Forget everything so the next use reloads from the source"""
+        with self._lock:
+            self._by_category = {}
+            self._all = []
+            self.loaded = False
+
+    def __len__(self):
+        return len(self._all)
+
+    def __repr__(self):
+        return f"<CategorySampler name={self.name} items={len(self._all)}>"
+
+
+class ResponseCache:
+    """LRU cache of API responses bounded by total size in bytes
+
+    Keys are (category, ...) tuples and hit rates are reported per category.
+    Each entry has its own TTL; an entry with an ETag can outlive it by
+    stale_ttl seconds, during which get() misses but get_stale() still hands
+    it back for a conditional request.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, name=None):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> [expires_at, stale_until, size, value, etag], oldest first
+        self._lock = threading.Lock()
+        self._counters = {}  # category -> {"hits": n, "misses": n, "revalidated": n}
+        self.evictions = 0
+
+    def _count(self, key, counter):
+        counters = self._counters.setdefault(key[0], {"hits": 0, "misses": 0, "revalidated": 0})
+        counters[counter] += 1
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self.bytes -= entry[2]
+
+    def get(self, key, default=None):
+        """Return the fresh value for key, or default"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None and entry[1] <= now:
+                    self._remove(key)
+                self._count(key, "misses")
+                return default
+            self._data.move_to_end(key)
+            self._count(key, "hits")
+            return entry[3]
+
+    def get_stale(self, key):
+        """Return (value, etag) for an expired entry that can be revalidated, else None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[4] is None or entry[1] <= time.monotonic():
+                return None
+            return entry[3], entry[4]
+
+    def set(self, key, value, size, ttl, etag=None, stale_ttl=0):
+        """Store value, whose size in bytes the caller estimates, evicting LRU entries to fit"""
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = [now + ttl, now + ttl + (stale_ttl if etag else 0), size, value, etag]
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def refresh(self, key, ttl):
+        """Mark key fresh again after the origin confirmed it unchanged (HTTP 304)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            stale_ttl = entry[1] - entry[0]
+            entry[0], entry[1] = now + ttl, now + ttl + stale_ttl
+            self._data.move_to_end(key)
+            self._count(key, "revalidated")
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return size in entries and bytes, plus hit counters per category"""
+        categories = {}
+        for category, counters in self._counters.items():
+            lookups = counters["hits"] + counters["misses"]
+            categories[category] = dict(counters, hit_rate=round(counters["hits"] / lookups, 4) if lookups else 0.0)
+        return {
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "categories": categories,
+        }
+
+    def __repr__(self):
+        return f"<ResponseCache name={self.name} bytes={self.bytes}/{self.max_bytes}>"
@@ -0,0 +1,171 @@
+"""
+Cross-process cache invalidation for the bot's in-memory caches
+
+Every write publishes (table, guild_id, key); every other process subscribed
+to the bus evicts just the matching cache entries. Redis pub/sub is used when
+REDIS_URL is set and reachable, otherwise invalidations stay in-process.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait on connecting to or hearing back from Redis, so an unreachable
+# REDIS_URL falls back to a LocalBus at startup instead of hanging on the OS TCP timeout
+REDIS_TIMEOUT = float(os.environ.get("REDIS_TIMEOUT", 2.0))
+
+class CacheBus:
+    """Base class: fans received invalidations out to subscribed handlers
+
+    Handlers are called as handler(table, guild_id, key). A table of None
+    means "state may have been missed, drop everything".
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex  # Lets a process ignore its own messages
+        self._handlers = []
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, table, guild_id=None, key=None):
+        raise NotImplementedError
+
+    def _message(self, table, guild_id, key):
+        return {"origin": self.origin, "table": table, "guild_id": guild_id, "key": key}
+
+    def _deliver(self, message):
+        if message.get("origin") == self.origin:
+            return
+        self.received += 1
+        for handler in self._handlers:
+            try:
+                handler(message.get("table"), message.get("guild_id"), message.get("key"))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Cache invalidation handler failed for {message}: {e}")
+
+    def stats(self):
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+# Buses started in this process, shared by every LocalBus by default
+_local_hub = []
+_local_hub_lock = threading.Lock()
+
+class LocalBus(CacheBus):
+    """In-memory bus delivering to the other buses started on the same hub
+
+    A single process only has one set of caches, so with one bus this is a
+    no-op; several buses on a hub stand in for several processes in tests.
+    """
+
+    def __init__(self, hub=None):
+        super().__init__()
+        self.hub = _local_hub if hub is None else hub
+
+    def start(self):
+        with _local_hub_lock:
+            if self not in self.hub:
+                self.hub.append(self)
+
+    def stop(self):
+        with _local_hub_lock:
+            if self in self.hub:
+                self.hub.remove(self)
+
+    def publish(self, table, guild_id=None, key=None):
+        message = self._message(table, guild_id, key)
+        self.published += 1
+        with _local_hub_lock:
+            buses = list(self.hub)
+        for bus in buses:
+            bus._deliver(message)
+
+
+class RedisBus(CacheBus):
+    """Redis pub/sub bus; a daemon thread listens and applies invalidations"""
+
+    def __init__(self, url, channel="lx:cache-invalidation", timeout=REDIS_TIMEOUT):
+        super().__init__()
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=timeout, socket_timeout=timeout)
+        self.channel = channel
+        self._pubsub = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(
+            sleep_time=1.0, daemon=True, exception_handler=self._on_error
+        )
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def publish(self, table, guild_id=None, key=None):
+        try:
+            self.client.publish(self.channel, json.dumps(self._message(table, guild_id, key)))
+            self.published += 1
+        except redis.RedisError as e:
+            self.errors += 1
+            logger.error(f"Failed to publish cache invalidation for {table}/{guild_id}: {e}")
+
+    def _on_message(self, message):
+        try:
+            self._deliver(json.loads(message["data"]))
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Ignoring malformed cache invalidation: {e}")
+
+    def _on_error(self, error, pubsub, thread):
+        # Messages sent while disconnected are lost, so drop everything local
+        self.errors += 1
+        logger.warning(f"Cache invalidation bus disconnected ({error}); clearing local caches")
+        self._deliver({"origin": None, "table": None})
+        time.sleep(1.0)
+
+
+def create_bus(url=None):
+    """Redis bus if url (default REDIS_URL) is set and reachable, else a LocalBus"""
+    url = url or os.environ.get("REDIS_URL")
+    if url and redis is not None:
+        try:
+            bus = RedisBus(url)
+            bus.client.ping()
+            return bus
+        except redis.RedisError as e:
+            logger.warning(f"Redis unavailable ({e}); cache invalidations stay in-process")
+    elif url:
+        logger.warning("REDIS_URL is set but the redis package is not installed")
+    return LocalBus()
@@ -0,0 +1,135 @@
+"""
+Per-provider circuit breakers, so a failing or slow API is skipped instead of waited on
+"""
+import collections
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+    def __init__(self, provider, retry_after):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} is unavailable right now, try again in {max(1, round(retry_after))}s")
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, or when the p95 of
+    the last `window` successful calls exceeds latency_threshold_ms (and
+    more than one of them was that slow)
+
+    An open breaker rejects calls for reset_timeout seconds, then lets a
+    single probe through (half-open): its success closes the breaker, its
+    failure opens it again.
+    """
+
+    def __init__(self, provider, failure_threshold=5, reset_timeout=30.0, latency_threshold_ms=None,
+                 window=20, min_samples=10):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_threshold_ms = latency_threshold_ms
+        self.min_samples = min_samples
+        self.latencies = collections.deque(maxlen=window)
+        self.state = CLOSED
+        self.failures = 0  # Consecutive
+        self.opened_at = 0.0
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    def before_request(self):
+        """Raise CircuitOpen unless a request may be sent now"""
+        if self.state == OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpen(self.provider, self.reset_timeout - elapsed)
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpen(self.provider, 1.0)
+            self._probing = True
+
+    def record_success(self, latency_ms):
+        self._probing = False
+        self.failures = 0
+        self.latencies.append(latency_ms)
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            logger.info(f"Circuit for {self.provider} closed")
+            return
+        p95 = self.p95()
+        if self.latency_threshold_ms is None or p95 is None or p95 <= self.latency_threshold_ms:
+            return
+        # A single outlier isn't a spike; require at least two slow calls
+        slow = sum(1 for latency in self.latencies if latency > self.latency_threshold_ms)
+        if slow >= 2:
+            self._open(f"p95 latency {p95:.0f}ms over {self.latency_threshold_ms:.0f}ms")
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self._open("probe failed")
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open(f"{self.failures} consecutive failures")
+
+    def release(self):
+        """End a request that recorded neither outcome (cancelled or rate limited)"""
+        self._probing = False
+
+    def p95(self):
+        """Nearest-rank 95th percentile of recent latencies (None until min_samples)"""
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+    def _open(self, reason):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        # The probe after reset_timeout judges the provider afresh
+        self.latencies.clear()
+        logger.warning(f"Circuit for {self.provider} opened: {reason}")
+
+    def stats(self):
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per provider, created on first use"""
+
+    def __init__(self, latency_thresholds=None, **options):
+        self.latency_thresholds = latency_thresholds or {}
+        self.options = options
+        self._breakers = {}
+
+    def get(self, provider):
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = CircuitBreaker(
+                provider, latency_threshold_ms=self.latency_thresholds.get(provider), **self.options
+            )
+        return breaker
+
+    def stats(self):
+        return {provider: breaker.stats() for provider, breaker in self._breakers.items()}
@@ -0,0 +1,146 @@
+import discord
+from discord.ext import commands
+import functools
+import re
+
+from db_handler import AsyncDatabaseHandler, custom_commands_cache
+from prefixes import match_prefix
+
+# {name} placeholders a response can use -> value for (message, args)
+VARIABLES = {
+    "user": lambda message, args: message.author.mention,
+    "user.name": lambda message, args: message.author.display_name,
+    "user.id": lambda message, args: str(message.author.id),
+    "channel": lambda message, args: message.channel.mention,
+    "channel.name": lambda message, args: message.channel.name,
+    "server": lambda message, args: message.guild.name,
+    "server.id": lambda message, args: str(message.guild.id),
+    "member_count": lambda message, args: str(message.guild.member_count),
+    "args": lambda message, args: args,
+}
+
+_PLACEHOLDER = re.compile(r"\{([a-z_]+(?:\.[a-z_]+)?)\}")
+
+# Custom commands may greet users but never mass-ping
+_ALLOWED_MENTIONS = discord.AllowedMentions(everyone=False, roles=False, users=True)
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(text):
+    """Split a response into (is_variable, value) parts, once per distinct response
+
+    Unknown placeholders are kept as literal text.
+    """
+    parts = []
+    last = 0
+    for match in _PLACEHOLDER.finditer(text):
+        if match.group(1) not in VARIABLES:
+            continue
+        if match.start() > last:
+            parts.append((False, text[last:match.start()]))
+        parts.append((True, match.group(1)))
+        last = match.end()
+    if last < len(text):
+        parts.append((False, text[last:]))
+    return tuple(parts)
+
+def render_template(template, message, args=""):
+    """Fill a compiled template in for one message"""
+    return "".join(VARIABLES[value](message, args) if is_variable else value for is_variable, value in template)
+
+class CustomCommandsCog(commands.Cog):
+    """Per-server text commands created by moderators"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_check(self, ctx):
+        # Covers every subcommand; a group's own guild_only() only guards the bare group
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        return True
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Answer messages that invoke one of the guild's custom commands"""
+        if message.author.bot or message.guild is None:
+            return
+
+        content = message.content
+        prefix = match_prefix(message.guild.id, content)
+        if prefix is None:
+            return
+
+        words = content[len(prefix):].split(maxsplit=1)
+        if not words:
+            return
+        name = words[0]
+        args = words[1] if len(words) > 1 else ""
+
+        # Every guild's full command set is one dict, so this is a single
+        # hash lookup however many commands the guild has
+        guild_commands = custom_commands_cache.get(message.guild.id)
+        if guild_commands is None:
+            guild_commands = await AsyncDatabaseHandler.get_custom_commands(message.guild.id)
+            if guild_commands is None:
+                return
+        command = guild_commands.get(name)
+        if command is None or self.bot.get_command(name) is not None:
+            # Built-in commands always win
+            return
+
+        response = render_template(compile_template(command.response), message, args)
+        if response:
+            await message.channel.send(response[:2000], allowed_mentions=_ALLOWED_MENTIONS)
+
+    @commands.group(name="customcommand", aliases=["cc"], invoke_without_command=True)
+    async def customcommand(self, ctx):
+        """Manage this server's custom commands"""
+        variables = ", ".join(f"`{{{name}}}`" for name in VARIABLES)
+        await ctx.send(
+            "Usage: `customcommand add <name> <response>`, `customcommand remove <name>`, "
+            f"`customcommand list`\nResponses can use {variables}"
+        )
+
+    @customcommand.command(name="add")
+    @commands.has_permissions(manage_guild=True)
+    async def customcommand_add(self, ctx, name: str, *, response: str):
+        """Create or replace a custom command"""
+        if self.bot.get_command(name) is not None:
+            await ctx.send(f"❌ `{name}` is already a built-in command.")
+            return
+        if len(name) > 50:
+            await ctx.send("❌ Command names can be at most 50 characters.")
+            return
+
+        if await AsyncDatabaseHandler.add_custom_command(ctx.guild.id, name, response):
+            await ctx.send(f"✅ Custom command `{name}` saved.")
+        else:
+            await ctx.send("❌ Failed to save the custom command.")
+
+    @customcommand.command(name="remove", aliases=["delete"])
+    @commands.has_permissions(manage_guild=True)
+    async def customcommand_remove(self, ctx, name: str):
+        """Delete a custom command"""
+        if await AsyncDatabaseHandler.remove_custom_command(ctx.guild.id, name):
+            await ctx.send(f"🗑️ Custom command `{name}` removed.")
+        else:
+            await ctx.send(f"❌ No custom command named `{name}`.")
+
+    @customcommand.command(name="list")
+    async def customcommand_list(self, ctx):
+        """List this server's custom commands"""
+        guild_commands = await AsyncDatabaseHandler.get_custom_commands(ctx.guild.id)
+        if not guild_commands:
+            await ctx.send("This server has no custom commands.")
+            return
+
+        names = ", ".join(f"`{name}`" for name in sorted(guild_commands))
+        embed = discord.Embed(
+            title=f"Custom Commands ({len(guild_commands)})",
+            description=names[:4000],
+            color=0x3a9efa
+        )
+        await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(CustomCommandsCog(bot))
@@ -1,10 +1,21 @@
 import discord
 from discord.ext import commands
 import random
-import aiohttp
 import os
 from typing import Optional
 
+from cache import ResponseCache
+from http_client import hedged
+
+# Seconds to wait on Tenor before also asking GIPHY, and on both before giving up
+HEDGE_DELAY = 0.8
+GIF_DEADLINE = 3.0
+
+# Search results are reused for this long; a random pick from them still varies
+GIF_CACHE_TTL = 6 * 3600
+
+gif_cache = ResponseCache(max_bytes=1024 * 1024, name="gif")
+
 class GifCog(commands.Cog):
     """Send various GIFs and animated reactions"""
     
@@ -131,37 +142,58 @@ class GifCog(commands.Cog):
             ]
         }
     
+    async def tenor_search(self, search_term, limit=10):
+        """GIF URLs from Tenor for search_term (empty if unavailable)"""
+        if not self.tenor_api_key:
+            return []
+        data = await self.bot.http_client.get_json(
+            "https://tenor.googleapis.com/v2/search", provider="tenor",
+            params={"q": search_term, "key": self.tenor_api_key, "limit": limit, "media_filter": "gif"},
+            rate_key=self.tenor_api_key
+        )
+        return [result["media_formats"]["gif"]["url"] for result in data.get("results", [])]
+    
+    async def giphy_search(self, search_term, limit=10):
+        """GIF URLs from GIPHY for search_term (empty if unavailable)"""
+        if not self.giphy_api_key:
+            return []
+        data = await self.bot.http_client.get_json(
+            "https://api.giphy.com/v1/gifs/search", provider="giphy",
+            params={"api_key": self.giphy_api_key, "q": search_term, "limit": limit},
+            rate_key=self.giphy_api_key
+        )
+        return [result["images"]["original"]["url"] for result in data.get("data", [])]
+    
+    async def search_gif(self, search_term, limit=10):
+        """A random GIF URL for search_term from Tenor or GIPHY (None if neither has one in time)
+
+        GIPHY is asked too if Tenor hasn't answered within HEDGE_DELAY, and
+        the whole lookup gives up after GIF_DEADLINE, so a degraded provider
+        never holds up the command for longer than that. Results are cached
+        in memory and on disk for GIF_CACHE_TTL.
+        """
+        key = ("gif", " ".join(search_term.lower().split()), limit)
+        urls = gif_cache.get(key)
+        if urls is None:
+            entry = await self.bot.disk_cache.get(key)
+            if entry is not None and entry[2] > 0:
+                urls = entry[0]
+                gif_cache.set(key, urls, entry[1], entry[2])
+        if urls is None:
+            urls = await hedged(
+                [lambda: self.tenor_search(search_term, limit), lambda: self.giphy_search(search_term, limit)],
+                delay=HEDGE_DELAY, timeout=GIF_DEADLINE
+            )
+            if urls:
+                gif_cache.set(key, urls, sum(len(url) for url in urls), GIF_CACHE_TTL)
+                self.bot.disk_cache.set(key, urls, GIF_CACHE_TTL)
+        return random.choice(urls) if urls else None
+    
     async def fetch_gif(self, action):
         """Fetch a random GIF for the specified action"""
-        # Try to use Tenor API first if key is available
-        if self.tenor_api_key:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    search_term = f"anime {action}"
-                    url = f"https://tenor.googleapis.com/v2/search?q={search_term}&key={self.tenor_api_key}&limit=10&media_filter=gif"
-                    
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if data["results"]:
-                                return data["results"][random.randint(0, len(data["results"])-1)]["media_formats"]["gif"]["url"]
-            except Exception:
-                pass
-        
-        # Try GIPHY API as fallback if key is available
-        if self.giphy_api_key:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    search_term = f"anime {action}"
-                    url = f"https://api.giphy.com/v1/gifs/search?api_key={self.giphy_api_key}&q={search_term}&limit=10"
-                    
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if data["data"]:
-                                return data["data"][random.randint(0, len(data["data"])-1)]["images"]["original"]["url"]
-            except Exception:
-                pass
+        gif_url = await self.search_gif(f"anime {action}")
+        if gif_url:
+            return gif_url
         
         # Use fallback GIFs if both API requests fail or no keys are provided
         return random.choice(self.fallback_gifs.get(action, ["https://media.giphy.com/media/3o7TKuFYevgE2b6Mx2/giphy.gif"]))
@@ -267,35 +299,7 @@ class GifCog(commands.Cog):
     async def gif(self, ctx, *, search_term: str):
         """Search for a GIF"""
         async with ctx.typing():
-            gif_url = None
-            
-            # Try Tenor API first
-            if self.tenor_api_key:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        url = f"https://tenor.googleapis.com/v2/search?q={search_term}&key={self.tenor_api_key}&limit=20&media_filter=gif"
-                        
-                        async with session.get(url) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                if data["results"]:
-                                    gif_url = data["results"][random.randint(0, len(data["results"])-1)]["media_formats"]["gif"]["url"]
-                except Exception:
-                    pass
-            
-            # Try GIPHY API as fallback
-            if not gif_url and self.giphy_api_key:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        url = f"https://api.giphy.com/v1/gifs/search?api_key={self.giphy_api_key}&q={search_term}&limit=20"
-                        
-                        async with session.get(url) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                if data["data"]:
-                                    gif_url = data["data"][random.randint(0, len(data["data"])-1)]["images"]["original"]["url"]
-                except Exception:
-                    pass
+            gif_url = await self.search_gif(search_term, limit=20)
             
             if gif_url:
                 embed = discord.Embed(
@@ -1,5 +1,6 @@
 import discord
 from discord.ext import commands
+from discord import app_commands
 import aiohttp
 import json
 import re
@@ -7,13 +8,122 @@ import urllib.parse
 import asyncio
 from typing import Optional, List, Dict, Any, Union
 import os
+import datetime
+
+from cache import ResponseCache, TTLCache
+from models import SearchHistory
+from rate_limiter import RateLimitExceeded
+
+# Seconds a response stays fresh, per provider
+RESPONSE_TTLS = {
+    "google": 3600,
+    "youtube": 1800,
+    "wikipedia": 6 * 3600,
+    "urban": 3600,
+    "github": 300,
+    "weather": 600,
+}
+
+# Providers that send ETags: how long past its TTL a response is kept to
+# revalidate with If-None-Match (a 304 doesn't count against GitHub's limit)
+REVALIDATE_TTLS = {
+    "github": 24 * 3600,
+}
+
+response_cache = ResponseCache(max_bytes=int(os.getenv("SEARCH_CACHE_BYTES", 8 * 1024 * 1024)), name="search")
+
+# Query parameters that carry credentials rather than the query itself
+CREDENTIAL_PARAMS = {"key", "api_key", "apikey", "appid", "access_token", "token"}
+
+def response_cache_key(provider: str, url: str) -> tuple:
+    """Cache key for a request: provider, host and path, and its normalised query parameters
+
+    Values are lowercased with whitespace collapsed so equivalent queries
+    share an entry. Credentials are left out, so keys never contain secrets
+    and rotating an API key doesn't empty the cache.
+    """
+    parts = urllib.parse.urlsplit(url)
+    params = tuple(sorted(
+        (name, " ".join(value.lower().split()))
+        for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in CREDENTIAL_PARAMS
+    ))
+    return (provider, parts.netloc.lower() + parts.path, params)
+
+# search all: overall deadline, and minimum seconds between embed edits
+# (Discord rate limits message edits, so answers arriving together share one)
+SEARCH_ALL_DEADLINE = 6.0
+SEARCH_ALL_EDIT_INTERVAL = 0.75
+
+# Wikipedia pages seen in search results, by lowercased title, so a query
+# naming an article exactly gets that article first
+wiki_pages = TTLCache(maxsize=2048, ttl=RESPONSE_TTLS["wikipedia"], name="wiki_pages")
+
+def parse_wikipedia_pages(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pages from a generator=search response, in search rank order"""
+    pages = result.get("query", {}).get("pages", [])
+    return [
+        {
+            "pageid": page["pageid"],
+            "title": page["title"],
+            "extract": page.get("extract") or "",
+            "url": page.get("fullurl") or f"https://en.wikipedia.org/?curid={page['pageid']}",
+            "disambiguation": "disambiguation" in page.get("pageprops", {}),
+        }
+        for page in sorted(pages, key=lambda page: page.get("index", 0))
+        if "missing" not in page
+    ]
+
+def wikipedia_embed(page: Dict[str, Any]) -> discord.Embed:
+    extract = page["extract"] or "No summary available."
+    if len(extract) > 2000:
+        extract = extract[:1997] + "..."
+    embed = discord.Embed(
+        title=page["title"],
+        url=page["url"],
+        description=extract,
+        color=0x3a9efa
+    )
+    embed.set_footer(text="Source: Wikipedia")
+    return embed
+
+class WikipediaSelect(discord.ui.Select):
+    """Switches the embed between the pages of one search response"""
+
+    def __init__(self, pages: List[Dict[str, Any]]):
+        self.pages = pages
+        options = [
+            discord.SelectOption(
+                label=page["title"][:100],
+                value=str(i),
+                description=(page["extract"] or "Disambiguation page")[:100]
+            )
+            for i, page in enumerate(pages)
+        ]
+        super().__init__(placeholder="📚 Did you mean...", min_values=1, max_values=1, options=options)
+
+    async def callback(self, interaction: discord.Interaction):
+        page = self.pages[int(self.values[0])]
+        await interaction.response.edit_message(embed=wikipedia_embed(page), view=self.view)
+
+class WikipediaView(discord.ui.View):
+    def __init__(self, pages: List[Dict[str, Any]], timeout=120):
+        super().__init__(timeout=timeout)
+        self.message = None
+        self.add_item(WikipediaSelect(pages))
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except:
+                pass
 
 class SearchCog(commands.Cog):
     """Search the web directly from Discord"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
         
         # API Keys - get from environment or use empty string
         self.google_api_key = os.getenv("GOOGLE_API_KEY", "")
@@ -22,21 +132,101 @@ class SearchCog(commands.Cog):
         self.youtube_api_key = os.getenv("YOUTUBE_API_KEY", "")
         self.github_token = os.getenv("GITHUB_TOKEN", "")
     
-    def cog_unload(self):
-        """Clean up the aiohttp session when the cog is unloaded"""
-        if self.session:
-            self.bot.loop.create_task(self.session.close())
+    async def cog_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.CommandOnCooldown):
+            message = f"⏳ Slow down! Try again in {max(1, round(error.retry_after))}s."
+            if interaction.response.is_done():
+                await interaction.followup.send(message, ephemeral=True)
+            else:
+                await interaction.response.send_message(message, ephemeral=True)
+    
+    async def cog_after_invoke(self, ctx):
+        query = ctx.kwargs.get("query") or ctx.kwargs.get("location")
+        if query:
+            self.record_search(ctx.author, query, ctx.command.name)
     
-    async def make_request(self, url: str, headers: Dict[str, str] = None) -> Dict[str, Any]:
-        """Make a request to the specified URL and return the JSON response"""
+    def record_search(self, user, query: str, search_type: str):
+        """Record the search for analytics (buffered, never delays the command)"""
+        recorder = getattr(self.bot, "usage_recorder", None)
+        if recorder:
+            recorder.record(
+                SearchHistory,
+                username=user.name,
+                user_id=user.id,
+                query=query[:255],
+                search_type=search_type[:20],
+                searched_at=datetime.datetime.utcnow()
+            )
+    
+    async def make_request(self, url: str, headers: Dict[str, str] = None, provider: str = "default",
+                           rate_key: str = None) -> Dict[str, Any]:
+        """Make a request to the specified URL and return the JSON response
+
+        Successful responses are cached for the provider's RESPONSE_TTLS, in
+        memory and in the bot's disk cache so they survive restarts.
+        """
+        key = response_cache_key(provider, url)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        stale = response_cache.get_stale(key)
+        if stale is None:
+            entry = await self.bot.disk_cache.get(key)
+            if entry is not None:
+                value, size, ttl_left, stale_ttl, etag = entry
+                response_cache.set(key, value, size, ttl_left, etag=etag, stale_ttl=stale_ttl)
+                if ttl_left > 0:
+                    return value
+                stale = (value, etag) if etag else None
+
         try:
-            async with self.session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    return {"error": f"Status {response.status}: {response.reason}"}
+            data, etag = await self.bot.http_client.get_json_conditional(
+                url, stale[1] if stale else None, provider=provider, headers=headers, rate_key=rate_key
+            )
+        except RateLimitExceeded as e:
+            return {"error": str(e)}
+        except aiohttp.ClientResponseError as e:
+            return {"error": f"Status {e.status}: {e.message}"}
+        except asyncio.TimeoutError:
+            return {"error": "Request timed out"}
         except Exception as e:
             return {"error": str(e)}
+
+        ttl = RESPONSE_TTLS.get(provider)
+        stale_ttl = REVALIDATE_TTLS.get(provider, 0)
+        if data is None:
+            # 304 Not Modified: our stale copy is current again
+            response_cache.refresh(key, ttl)
+            self.bot.disk_cache.set(key, stale[0], ttl, etag=etag, stale_ttl=stale_ttl)
+            return stale[0]
+        if ttl and isinstance(data, dict):
+            size = len(json.dumps(data, separators=(",", ":")))
+            response_cache.set(key, data, size, ttl, etag=etag, stale_ttl=stale_ttl)
+            self.bot.disk_cache.set(key, data, ttl, etag=etag, stale_ttl=stale_ttl)
+        return data
+    
+    @commands.command(name="searchcache")
+    @commands.is_owner()
+    async def search_cache(self, ctx):
+        """Show search response cache size and hit rates"""
+        stats = response_cache.stats()
+        lines = [
+            f"entries: {stats['size']}, {stats['bytes'] / 1024:.0f}/{stats['max_bytes'] / 1024:.0f} KiB, "
+            f"{stats['evictions']} evicted"
+        ]
+        lines += [
+            f"{provider}: {counters['hit_rate']:.0%} hit ({counters['hits']} hits, {counters['misses']} misses, "
+            f"{counters['revalidated']} revalidated)"
+            for provider, counters in sorted(stats["categories"].items())
+        ]
+        disk = self.bot.disk_cache.stats()
+        lines += [
+            f"disk: {disk['hit_rate']:.0%} hit ({disk['hits']} hits, {disk['misses']} misses), "
+            f"{disk['bytes'] / 1024:.0f}/{disk['max_bytes'] / 1024:.0f} KiB, {disk['evictions']} evicted, "
+            f"{disk['errors']} errors"
+        ]
+        body = "\n".join(lines)
+        await ctx.send(f"🗃️ Search cache:\n```{body}```")
     
     def create_embed_pages(self, items: List[Dict[str, Any]], title: str, formatter) -> List[discord.Embed]:
         """Create paginated embeds from a list of items using the provided formatter function"""
@@ -77,7 +267,7 @@ class SearchCog(commands.Cog):
             url = f"https://www.googleapis.com/customsearch/v1?key={self.google_api_key}&cx={self.google_cx}&q={encoded_query}"
             
             # Make the request
-            result = await self.make_request(url)
+            result = await self.make_request(url, provider="google", rate_key=self.google_api_key)
             
             if "error" in result:
                 await ctx.send(f"❌ Error: {result['error']}")
@@ -163,7 +353,7 @@ class SearchCog(commands.Cog):
             url = f"https://www.googleapis.com/youtube/v3/search?key={self.youtube_api_key}&part=snippet&type=video&q={encoded_query}&maxResults=10"
             
             # Make the request
-            result = await self.make_request(url)
+            result = await self.make_request(url, provider="youtube", rate_key=self.youtube_api_key)
             
             if "error" in result:
                 await ctx.send(f"❌ Error: {result['error']}")
@@ -234,68 +424,76 @@ class SearchCog(commands.Cog):
                         pass
                     break
     
+    async def wikipedia_search(self, query: str) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+        """Top Wikipedia pages for query with their intro extracts, in one request
+
+        Returns an error dict if the request fails.
+        """
+        encoded_query = urllib.parse.quote(query)
+        url = (
+            "https://en.wikipedia.org/w/api.php?action=query&format=json&formatversion=2"
+            f"&generator=search&gsrsearch={encoded_query}&gsrlimit=5"
+            "&prop=extracts|info|pageprops&exintro=1&explaintext=1&exlimit=max&inprop=url&ppprop=disambiguation"
+        )
+        result = await self.make_request(url, provider="wikipedia")
+        if "error" in result:
+            return result
+
+        pages = parse_wikipedia_pages(result)
+        for page in pages:
+            if not page["disambiguation"]:
+                wiki_pages.set(page["title"].lower(), page)
+        # Lead with the best match that isn't a disambiguation page, unless the
+        # query names a known article exactly; the rest stay as alternatives
+        pages.sort(key=lambda page: page["disambiguation"])
+        exact = wiki_pages.get(" ".join(query.lower().split()))
+        if exact is not None:
+            pages = [exact] + [page for page in pages if page["pageid"] != exact["pageid"]]
+        return pages
+    
     @commands.command(name="wikipedia", aliases=["wiki"])
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def wikipedia(self, ctx, *, query: str):
         """Search Wikipedia for information"""
         # Indicate that the bot is searching
         async with ctx.typing():
-            # URL encode the query
-            encoded_query = urllib.parse.quote(query)
+            pages = await self.wikipedia_search(query)
             
-            # First search for articles
-            search_url = f"https://en.wikipedia.org/w/api.php?action=query&list=search&srsearch={encoded_query}&format=json"
-            
-            # Make the request
-            search_result = await self.make_request(search_url)
-            
-            if "error" in search_result:
-                await ctx.send(f"❌ Error: {search_result['error']}")
+            if isinstance(pages, dict):
+                await ctx.send(f"❌ Error: {pages['error']}")
                 return
             
-            # Check if there are search results
-            if "query" not in search_result or "search" not in search_result["query"] or not search_result["query"]["search"]:
+            if not pages:
                 await ctx.send(f"No Wikipedia articles found for '{query}'")
                 return
             
-            # Get the first result
-            first_result = search_result["query"]["search"][0]
-            page_id = first_result["pageid"]
-            
-            # Get the full content of the article
-            content_url = f"https://en.wikipedia.org/w/api.php?action=query&prop=extracts&exintro&explaintext&pageids={page_id}&format=json"
-            
-            # Make the request
-            content_result = await self.make_request(content_url)
-            
-            if "error" in content_result:
-                await ctx.send(f"❌ Error: {content_result['error']}")
+            if len(pages) == 1:
+                await ctx.send(embed=wikipedia_embed(pages[0]))
                 return
-            
-            # Extract the article content
-            try:
-                page = content_result["query"]["pages"][str(page_id)]
-                title = page["title"]
-                extract = page["extract"]
-                
-                # Truncate if too long
-                if len(extract) > 2000:
-                    extract = extract[:1997] + "..."
-                
-                # Create embed
-                embed = discord.Embed(
-                    title=title,
-                    url=f"https://en.wikipedia.org/?curid={page_id}",
-                    description=extract,
-                    color=0x3a9efa
-                )
-                
-                embed.set_footer(text="Source: Wikipedia")
-                
-                await ctx.send(embed=embed)
-                
-            except Exception as e:
-                await ctx.send(f"Failed to process Wikipedia article: {str(e)}")
+            view = WikipediaView(pages)
+            view.message = await ctx.send(embed=wikipedia_embed(pages[0]), view=view)
+    
+    @app_commands.command(name="wiki", description="📚 Search Wikipedia and pick between matching articles")
+    @app_commands.describe(query="What to look up")
+    @app_commands.checks.cooldown(1, 5)
+    async def wiki_slash(self, interaction: discord.Interaction, query: str):
+        await interaction.response.defer()
+        self.record_search(interaction.user, query, "wiki")
+        pages = await self.wikipedia_search(query)
+        
+        if isinstance(pages, dict):
+            await interaction.followup.send(f"❌ Error: {pages['error']}")
+            return
+        
+        if not pages:
+            await interaction.followup.send(f"No Wikipedia articles found for '{query}'")
+            return
+        
+        if len(pages) == 1:
+            await interaction.followup.send(embed=wikipedia_embed(pages[0]))
+            return
+        view = WikipediaView(pages)
+        view.message = await interaction.followup.send(embed=wikipedia_embed(pages[0]), view=view, wait=True)
     
     @commands.command(name="urban", aliases=["ud"])
     @commands.cooldown(1, 5, commands.BucketType.user)
@@ -315,7 +513,7 @@ class SearchCog(commands.Cog):
             url = f"https://api.urbandictionary.com/v0/define?term={encoded_query}"
             
             # Make the request
-            result = await self.make_request(url)
+            result = await self.make_request(url, provider="urban")
             
             if "error" in result:
                 await ctx.send(f"❌ Error: {result['error']}")
@@ -424,7 +622,7 @@ class SearchCog(commands.Cog):
                 headers["Authorization"] = f"token {self.github_token}"
             
             # Make the request
-            result = await self.make_request(url, headers)
+            result = await self.make_request(url, headers, provider="github", rate_key=self.github_token)
             
             if "error" in result:
                 await ctx.send(f"❌ Error: {result['error']}")
@@ -516,7 +714,7 @@ class SearchCog(commands.Cog):
             url = f"http://api.openweathermap.org/data/2.5/weather?q={encoded_location}&appid={api_key}&units=metric"
             
             # Make the request
-            result = await self.make_request(url)
+            result = await self.make_request(url, provider="weather", rate_key=api_key)
             
             if "error" in result:
                 await ctx.send(f"❌ Error: {result['error']}")
@@ -579,6 +777,137 @@ class SearchCog(commands.Cog):
             
             await ctx.send(embed=embed)
     
+    async def top_google(self, query: str) -> str:
+        url = f"https://www.googleapis.com/customsearch/v1?key={self.google_api_key}&cx={self.google_cx}&q={urllib.parse.quote(query)}"
+        result = await self.make_request(url, provider="google", rate_key=self.google_api_key)
+        if "error" in result:
+            return f"❌ {result['error']}"
+        return "\n".join(
+            f"[{item.get('title', 'No Title')}]({item.get('link', '#')})" for item in result.get("items", [])[:3]
+        )
+    
+    async def top_youtube(self, query: str) -> str:
+        url = f"https://www.googleapis.com/youtube/v3/search?key={self.youtube_api_key}&part=snippet&type=video&q={urllib.parse.quote(query)}&maxResults=10"
+        result = await self.make_request(url, provider="youtube", rate_key=self.youtube_api_key)
+        if "error" in result:
+            return f"❌ {result['error']}"
+        return "\n".join(
+            f"[{item['snippet']['title']}](https://www.youtube.com/watch?v={item['id']['videoId']})"
+            for item in result.get("items", [])[:3] if "videoId" in item.get("id", {})
+        )
+    
+    async def top_wikipedia(self, query: str) -> str:
+        pages = await self.wikipedia_search(query)
+        if isinstance(pages, dict):
+            return f"❌ {pages['error']}"
+        if not pages:
+            return ""
+        first, rest = pages[0], pages[1:3]
+        extract = first["extract"][:300] + ("..." if len(first["extract"]) > 300 else "")
+        return "\n".join([f"**[{first['title']}]({first['url']})** {extract}"] + [f"[{page['title']}]({page['url']})" for page in rest])
+    
+    async def top_github(self, query: str) -> str:
+        url = f"https://api.github.com/search/repositories?q={urllib.parse.quote(query)}&sort=stars&order=desc"
+        headers = {"Authorization": f"token {self.github_token}"} if self.github_token else {}
+        result = await self.make_request(url, headers, provider="github", rate_key=self.github_token)
+        if "error" in result:
+            return f"❌ {result['error']}"
+        return "\n".join(
+            f"[{repo['full_name']}]({repo['html_url']}) ⭐ {repo.get('stargazers_count', 0):,}"
+            for repo in result.get("items", [])[:3]
+        )
+    
+    async def top_urban(self, query: str) -> str:
+        url = f"https://api.urbandictionary.com/v0/define?term={urllib.parse.quote(query)}"
+        result = await self.make_request(url, provider="urban")
+        if "error" in result:
+            return f"❌ {result['error']}"
+        definitions = result.get("list", [])
+        if not definitions:
+            return ""
+        definition = definitions[0]["definition"].replace("[", "").replace("]", "")
+        return definition[:300] + ("..." if len(definition) > 300 else "")
+    
+    @commands.group(name="search", invoke_without_command=True)
+    async def search(self, ctx):
+        """Search commands"""
+        await self.searchhelp(ctx)
+    
+    @search.command(name="all")
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def search_all(self, ctx, *, query: str):
+        """Search every configured provider at once"""
+        providers = {}
+        if self.google_api_key and self.google_cx:
+            providers["🌐 Google"] = self.top_google
+        if self.youtube_api_key:
+            providers["▶️ YouTube"] = self.top_youtube
+        providers["📚 Wikipedia"] = self.top_wikipedia
+        providers["🐙 GitHub"] = self.top_github
+        if isinstance(ctx.channel, discord.DMChannel) or ctx.channel.is_nsfw():
+            providers["📖 Urban Dictionary"] = self.top_urban
+        
+        embed = discord.Embed(title=f"🔍 Results for '{query[:200]}'", color=0x3a9efa)
+        for name in providers:
+            embed.add_field(name=name, value="⏳ Searching...", inline=False)
+        embed.set_footer(text=f"Waiting on {len(providers)} providers")
+        message = await ctx.send(embed=embed)
+        
+        # Every provider runs at once; each field is filled in as its answer
+        # arrives and whatever is still out at the deadline is dropped
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + SEARCH_ALL_DEADLINE
+        tasks = {asyncio.ensure_future(search(query)): i for i, search in enumerate(providers.values())}
+        names = list(providers)
+        pending = set(tasks)
+        answered = 0
+        
+        def fill(task):
+            nonlocal answered
+            index = tasks[task]
+            error = task.exception()
+            if error is not None:
+                value = f"❌ {str(error) or type(error).__name__}"
+            else:
+                value = task.result() or "No results"
+                answered += 1
+            embed.set_field_at(index, name=names[index], value=value[:1024], inline=False)
+        
+        last_edit = started
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    fill(task)
+                if not pending or not done:
+                    # All answered or out of time; the final edit below covers it
+                    break
+                wait = SEARCH_ALL_EDIT_INTERVAL - (loop.time() - last_edit)
+                if wait > 0:
+                    # Let more answers land before spending an edit on this one
+                    await asyncio.sleep(min(wait, max(0.0, deadline - loop.time())))
+                    for task in [task for task in pending if task.done()]:
+                        pending.discard(task)
+                        fill(task)
+                    if not pending:
+                        break
+                embed.set_footer(text=f"{answered}/{len(providers)} providers answered, {len(pending)} pending")
+                await message.edit(embed=embed)
+                last_edit = loop.time()
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        for task in pending:
+            index = tasks[task]
+            embed.set_field_at(index, name=names[index], value="⌛ Too slow, skipped", inline=False)
+        embed.set_footer(text=f"{answered}/{len(providers)} providers answered in {loop.time() - started:.1f}s")
+        await message.edit(embed=embed)
+    
     @commands.command(name="searchhelp")
     async def searchhelp(self, ctx):
         """Show help for all search commands"""
@@ -624,6 +953,12 @@ class SearchCog(commands.Cog):
             inline=False
         )
         
+        embed.add_field(
+            name=f"{ctx.prefix}search all [query]",
+            value="Search every configured provider at once",
+            inline=False
+        )
+        
         embed.set_footer(text="All search commands have a cooldown to prevent API abuse")
         
         await ctx.send(embed=embed)
@@ -0,0 +1,60 @@
+import discord
+from discord.ext import commands, tasks
+import logging
+
+from db_handler import run_in_db_executor
+
+class StatsCog(commands.Cog):
+    """Command usage statistics"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self.rollup = getattr(bot, "usage_rollup", None)
+        if self.rollup and self.rollup.enabled:
+            self.rollup_loop.start()
+    
+    def cog_unload(self):
+        self.rollup_loop.cancel()
+    
+    @tasks.loop(minutes=10)
+    async def rollup_loop(self):
+        """Roll raw usage up into hourly/daily counters and prune old raw rows"""
+        try:
+            result = await run_in_db_executor(self.rollup.run)
+            if any(result.values()):
+                logging.info(f"📊 Usage rollup: {result}")
+        except Exception as e:
+            logging.error(f"❌ Usage rollup failed: {e}")
+    
+    @rollup_loop.before_loop
+    async def before_rollup_loop(self):
+        await self.bot.wait_until_ready()
+    
+    @commands.command(name="topcommands", aliases=["topcmds"])
+    @commands.guild_only()
+    @commands.cooldown(1, 10, commands.BucketType.guild)
+    async def topcommands(self, ctx, days: int = 7):
+        """Show the most used commands in this server"""
+        if not self.rollup or not self.rollup.enabled:
+            await ctx.send("⚠️ Usage statistics are not available.")
+            return
+        
+        days = max(1, min(days, 365))
+        top = await run_in_db_executor(self.rollup.top_commands, ctx.guild.id, days)
+        
+        if not top:
+            await ctx.send(f"No command usage recorded in the last {days} days.")
+            return
+        
+        embed = discord.Embed(
+            title=f"📊 Top Commands ({days} days)",
+            description="\n".join(
+                f"**{i}.** `{name}` — {count} uses" for i, (name, count) in enumerate(top, start=1)
+            ),
+            color=0x3a9efa
+        )
+        embed.set_footer(text="Stats update hourly")
+        await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(StatsCog(bot))
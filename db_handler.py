@@ -1,33 +1,384 @@
 import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import sqlalchemy as sa
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy import create_engine
-from models import Base, Guild, AutoRole, CustomCommand, RestrictedChannel, AllowedUser, UserSettings, AnimeGif
+from sqlalchemy import create_engine, event
+from models import (
+    Base, Guild, AutoRole, CustomCommand, RestrictedChannel, AllowedUser, UserSettings, AnimeGif,
+    GuildSettings, CustomCommandData, GuildConfig, guild_config_cache, config_commit_hooks,
+)
+from cache import TTLCache, CategorySampler
+from db_metrics import DatabaseMetrics
+from cache_bus import create_bus
 import functools
+from types import MappingProxyType
 
-# Get database URL from environment variable
+# Get database URL from environment variable, falling back to the SQLite file
+# the Flask app has always used so existing data is picked up
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
 DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    os.makedirs(INSTANCE_DIR, exist_ok=True)
+    DATABASE_URL = f"sqlite:///{os.path.join(INSTANCE_DIR, 'bot.db')}"
 
-# Create engine and session factory with optimized settings for better performance
-if DATABASE_URL:
+# Tuned SQLite profile: WAL lets the dashboard read while the bot writes
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",     # Safe with WAL; fsync only at checkpoints
+    "busy_timeout": 5000,        # ms to wait for a lock instead of failing
+    "cache_size": -64000,        # Negative = KiB, so ~64 MB page cache
+    "mmap_size": 268435456,      # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(engine, pragmas=None):
+    """Run the pragma profile on every new connection of a SQLite engine"""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+# Pool sizing, tunable from the numbers reported by db_metrics.stats()
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 200))
+
+# Optional read replica for cache-filling reads; writes always go to DATABASE_URL
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
+# How long after writing a key this process keeps reading it from the primary
+DB_REPLICA_LAG_SECONDS = float(os.environ.get("DB_REPLICA_LAG_SECONDS", 10))
+
+# Checkout waits, statement timings and queries slower than DB_SLOW_QUERY_MS
+db_metrics = DatabaseMetrics(slow_query_ms=DB_SLOW_QUERY_MS)
+read_db_metrics = DatabaseMetrics(slow_query_ms=DB_SLOW_QUERY_MS) if DATABASE_READ_URL else None
+
+def _create_engine(url, metrics):
+    """Pooled, instrumented engine with the settings shared by primary and replica"""
     engine = create_engine(
-        DATABASE_URL,
-        pool_size=10,          # Increase connection pool size
-        max_overflow=20,       # Allow more overflow connections
+        url,
+        poolclass=metrics.pool_class(),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
         pool_recycle=1800,     # Recycle connections after 30 minutes
         pool_pre_ping=True,    # Verify connection is still valid before using
         pool_timeout=30,       # Don't wait too long for a connection
         echo=False             # No SQL debug logging
     )
-    Session = scoped_session(sessionmaker(bind=engine))
+    apply_sqlite_pragmas(engine)
+    metrics.instrument(engine)
+    return engine
+
+# Create the one engine and session factory shared by the bot and the Flask app
+if DATABASE_URL:
+    engine = _create_engine(DATABASE_URL, db_metrics)
+    # expire_on_commit=False lets us snapshot rows right after commit without a reload
+    Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
 else:
     engine = None
     Session = None
 
-# Create cache dictionaries to reduce database queries
-guild_settings_cache = {}
-custom_commands_cache = {}
-restricted_channels_cache = {}
+if engine and DATABASE_READ_URL:
+    read_engine = _create_engine(DATABASE_READ_URL, read_db_metrics)
+    ReadSession = scoped_session(sessionmaker(bind=read_engine, expire_on_commit=False))
+else:
+    read_engine = engine
+    ReadSession = Session
+
+# Tells other processes which entries to evict after a write (Redis if REDIS_URL is set)
+cache_bus = create_bus()
+
+# (table, guild_id) pairs written recently (here or by another process), read from the primary until
+# the replica has had time to catch up
+recent_writes = TTLCache(maxsize=10000, ttl=DB_REPLICA_LAG_SECONDS, name="recent_writes")
+
+# Bounded worker pool for running blocking database calls off the event loop.
+# Sized to match pool_size so workers never queue waiting for a connection.
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+# Bounded caches of immutable snapshots to reduce database queries
+CACHE_MAX_GUILDS = int(os.environ.get("CACHE_MAX_GUILDS", 5000))
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 600))  # Seconds
+
+guild_settings_cache = TTLCache(CACHE_MAX_GUILDS, CACHE_TTL, name="guild_settings")
+# guild_id -> read-only {command_name: CustomCommandData} holding the guild's full command set
+custom_commands_cache = TTLCache(CACHE_MAX_GUILDS, CACHE_TTL, name="custom_commands")
+# guild_id -> frozenset of restricted channel ids
+restricted_channels_cache = TTLCache(CACHE_MAX_GUILDS, CACHE_TTL, name="restricted_channels")
+# guild_id -> tuple of auto-role ids
+auto_roles_cache = TTLCache(CACHE_MAX_GUILDS, CACHE_TTL, name="auto_roles")
+
+# Max ids per IN (...) clause when bulk loading, well under SQLite's variable limit
+WARM_CHUNK_SIZE = 500
+
+# category -> GIF URLs, loaded once so random picks never hit the database
+gif_index = CategorySampler(name="anime_gifs")
+_gif_index_lock = threading.Lock()
+
+def _get_upsert_insert(engine):
+    """Return the dialect's insert() construct supporting ON CONFLICT, or None"""
+    if engine is None:
+        return None
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+# INSERT ... ON CONFLICT DO UPDATE ... RETURNING for single round trip writes
+upsert_insert = _get_upsert_insert(engine)
+
+def _delete_duplicates(table, columns, keep="MIN"):
+    """SQL deleting all but one row (lowest or highest id) per group of columns"""
+    group = ", ".join(columns)
+    return (
+        f"DELETE FROM {table} WHERE id NOT IN ("
+        f"SELECT {keep}(id) FROM {table} GROUP BY {group})"
+    )
+
+# Statements that collapse duplicate rows so a unique index can be created on
+# databases that predate it, keyed by index name
+DEDUPLICATE_SQL = {
+    "uq_auto_roles_guild_role": [
+        _delete_duplicates("auto_roles", ["guild_id", "role_id"]),
+    ],
+    "uq_custom_commands_guild_name": [
+        # The newest row holds the most recent response
+        _delete_duplicates("custom_commands", ["guild_id", "name"], keep="MAX"),
+    ],
+    "uq_restricted_channels_guild_channel": [
+        # Move allowed users onto the row that survives...
+        """UPDATE allowed_users SET channel_id = (
+               SELECT MIN(keep.id) FROM restricted_channels dup, restricted_channels keep
+               WHERE dup.id = allowed_users.channel_id
+                 AND keep.guild_id = dup.guild_id AND keep.channel_id = dup.channel_id
+           )
+           WHERE channel_id IN (
+               SELECT id FROM restricted_channels WHERE id NOT IN (
+                   SELECT MIN(id) FROM restricted_channels GROUP BY guild_id, channel_id
+               )
+           )""",
+        # ...then drop the duplicates
+        _delete_duplicates("restricted_channels", ["guild_id", "channel_id"]),
+    ],
+    "uq_allowed_users_channel_user": [
+        _delete_duplicates("allowed_users", ["channel_id", "user_id"]),
+    ],
+    "uq_user_settings_guild_user": [
+        # Fold duplicate warning counts into the oldest row...
+        """UPDATE user_settings SET warn_count = (
+               SELECT SUM(COALESCE(dup.warn_count, 0)) FROM user_settings dup
+               WHERE dup.guild_id = user_settings.guild_id AND dup.user_id = user_settings.user_id
+           )
+           WHERE id IN (
+               SELECT MIN(id) FROM user_settings GROUP BY guild_id, user_id HAVING COUNT(*) > 1
+           )""",
+        # ...then drop the rest
+        _delete_duplicates("user_settings", ["guild_id", "user_id"]),
+    ],
+}
+
+# The Flask app's former guild table, folded into guilds by migrate_db()
+LEGACY_GUILD_TABLE = "guild"
+LEGACY_GUILD_COLUMNS = ["name", "icon_url", "owner_id", "member_count", "created_at", "joined_at", "config"]
+
+def _quote(name):
+    return engine.dialect.identifier_preparer.quote(name)
+
+def _add_missing_columns(inspector, table):
+    """ALTER TABLE ... ADD COLUMN for model columns the existing table lacks"""
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(sa.text(
+                f"ALTER TABLE {_quote(table.name)} ADD COLUMN {_quote(column.name)} {column_type}"
+            ))
+        print(f"✅ Added column {column.name} to {table.name}")
+
+def _merge_legacy_guilds(conn):
+    """Copy server metadata and config from the legacy guild table into guilds
+    
+    The prefix is deliberately not copied: the bot's own prefix always won.
+    """
+    legacy = sa.Table(LEGACY_GUILD_TABLE, sa.MetaData(), autoload_with=conn)
+    columns = [name for name in LEGACY_GUILD_COLUMNS if name in legacy.c]
+    rows = []
+    for row in conn.execute(sa.select(legacy.c.id, *(legacy.c[name] for name in columns))).mappings():
+        values = dict(row)
+        if isinstance(values.get("config"), str):
+            # Older rows stored config as a JSON string in a TEXT column
+            try:
+                values["config"] = json.loads(values["config"]) if values["config"] else None
+            except json.JSONDecodeError:
+                print(f"Dropping unreadable config for guild {values['id']}")
+                values["config"] = None
+        rows.append(values)
+    
+    table = Guild.__table__
+    for batch in _chunks(rows, WARM_CHUNK_SIZE):
+        if upsert_insert is not None:
+            stmt = upsert_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.id], set_={name: stmt.excluded[name] for name in columns}
+            )
+            conn.execute(stmt, batch)
+            continue
+        for values in batch:
+            updated = conn.execute(
+                sa.update(table).where(table.c.id == values["id"]).values(**values)
+            ).rowcount
+            if not updated:
+                conn.execute(sa.insert(table).values(**values))
+    return len(rows)
+
+def _repoint_foreign_keys(conn, table):
+    """Make table's foreign keys to the legacy guild table reference guilds instead"""
+    inspector = sa.inspect(conn)
+    stale = [fk for fk in inspector.get_foreign_keys(table.name) if fk["referred_table"] == LEGACY_GUILD_TABLE]
+    if not stale:
+        return False
+    
+    if conn.dialect.name == "postgresql":
+        for fk in stale:
+            conn.execute(sa.text(f"ALTER TABLE {_quote(table.name)} DROP CONSTRAINT {_quote(fk['name'])}"))
+        for constraint in table.foreign_key_constraints:
+            if constraint.referred_table is Guild.__table__:
+                conn.execute(sa.schema.AddConstraint(constraint))
+        return True
+    
+    # SQLite can't alter constraints: rebuild the table from the model and copy the rows
+    columns = ", ".join(
+        _quote(column["name"]) for column in inspector.get_columns(table.name) if column["name"] in table.c
+    )
+    old_name = _quote(f"{table.name}_old")
+    for index in inspector.get_indexes(table.name):
+        conn.execute(sa.text(f"DROP INDEX {_quote(index['name'])}"))
+    conn.execute(sa.text(f"ALTER TABLE {_quote(table.name)} RENAME TO {old_name}"))
+    table.create(conn)
+    conn.execute(sa.text(f"INSERT INTO {_quote(table.name)} ({columns}) SELECT {columns} FROM {old_name}"))
+    conn.execute(sa.text(f"DROP TABLE {old_name}"))
+    return True
+
+def migrate_legacy_guilds():
+    """Fold the Flask app's guild table into guilds and retire it
+    
+    Rows are merged, foreign keys that pointed at guild are moved to guilds,
+    and the old table is kept as guild_legacy rather than dropped.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            # Stop SQLite from rewriting other tables' references on RENAME
+            conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+        merged = _merge_legacy_guilds(conn)
+        for table in Base.metadata.sorted_tables:
+            if _repoint_foreign_keys(conn, table):
+                print(f"✅ Moved foreign keys on {table.name} to guilds")
+        conn.execute(sa.text(
+            f"ALTER TABLE {_quote(LEGACY_GUILD_TABLE)} RENAME TO {_quote(LEGACY_GUILD_TABLE + '_legacy')}"
+        ))
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+    print(f"✅ Merged {merged} rows from {LEGACY_GUILD_TABLE} into guilds")
+
+def _column_value(column, value):
+    """Convert a JSON config value to column's Python type (ValueError if it can't be)"""
+    kind = column.type.python_type
+    if kind is bool and isinstance(value, str):
+        text = value.strip().lower()
+        if text not in ("1", "true", "yes", "on", "0", "false", "no", "off"):
+            raise ValueError(f"not a boolean: {value!r}")
+        return text in ("1", "true", "yes", "on")
+    return kind(value)
+
+def migrate_config_columns():
+    """Move settings that have their own Guild column out of the JSON config
+    
+    Each such key's value is written to its column, overriding the column's
+    default, and the key is removed from config. A value that doesn't fit
+    the column's type is left in config and reported.
+    """
+    table = Guild.__table__
+    keys = GuildConfig.COLUMN_KEYS
+    moved = 0
+    with engine.begin() as conn:
+        rows = conn.execute(
+            sa.select(table.c.id, table.c.config).where(table.c.config.isnot(None))
+        ).mappings().all()
+        for row in rows:
+            config = row["config"]
+            if isinstance(config, str):
+                try:
+                    config = json.loads(config)
+                except json.JSONDecodeError:
+                    continue
+            if not isinstance(config, dict) or not any(key in config for key in keys):
+                continue
+            values = {}
+            remaining = dict(config)
+            for key in keys:
+                if key not in config:
+                    continue
+                if config[key] is not None:
+                    try:
+                        values[key] = _column_value(table.c[key], config[key])
+                    except (TypeError, ValueError):
+                        print(f"Keeping unreadable {key} in config for guild {row['id']}")
+                        continue
+                del remaining[key]
+            if len(remaining) == len(config):
+                continue
+            values["config"] = remaining
+            conn.execute(sa.update(table).where(table.c.id == row["id"]).values(**values))
+            moved += 1
+    if moved:
+        print(f"✅ Moved column settings out of config for {moved} guilds")
+
+def migrate_db():
+    """Bring an existing database up to date with the tables, columns and indexes declared in models.py"""
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            # New table: create it along with all of its indexes
+            table.create(engine)
+            print(f"✅ Created table {table.name}")
+            continue
+        
+        _add_missing_columns(inspector, table)
+            
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        existing.update(uc["name"] for uc in inspector.get_unique_constraints(table.name))
+        
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            with engine.begin() as conn:
+                if index.unique:
+                    for statement in DEDUPLICATE_SQL.get(index.name, []):
+                        conn.execute(sa.text(statement))
+                index.create(conn)
+            print(f"✅ Added index {index.name} on {table.name}")
+    
+    if LEGACY_GUILD_TABLE in existing_tables:
+        migrate_legacy_guilds()
+    migrate_config_columns()
 
 def init_db():
     """Initialize database and tables"""
@@ -39,15 +390,65 @@ def init_db():
         # Get existing tables
         existing_tables = inspector.get_table_names()
         
-        if 'guilds' not in existing_tables:
-            # Tables don't exist yet, create them
+        if not existing_tables:
+            # Fresh database, create everything
             Base.metadata.create_all(engine)
             print("✅ Database tables created!")
         else:
             print("✅ Database tables already exist!")
+            migrate_db()
     else:
         print("❌ No database connection available.")
 
+def _cache_restricted_channel(guild_id, channel_id):
+    """Add a newly restricted channel to the guild's cached set, if loaded"""
+    channels = restricted_channels_cache.get(guild_id)
+    if channels is not None:
+        restricted_channels_cache.set(guild_id, channels | {channel_id})
+
+def _record_write(table, guild_id=None, key=None):
+    """Note a committed write: read it back from the primary and tell other processes"""
+    if ReadSession is not Session:
+        recent_writes.set((table, guild_id), True)
+    cache_bus.publish(table, guild_id, key)
+
+# Guild config writes (Guild.save_config / set_config) publish once committed
+config_commit_hooks.append(lambda guild_id: _record_write("guilds", guild_id))
+
+def _apply_invalidation(table, guild_id, key):
+    """Evict the cache entries made stale by another process's write"""
+    if table is None:
+        DatabaseHandler.clear_cache()
+        return
+    if ReadSession is not Session:
+        # The replica may not have that write yet either
+        recent_writes.set((table, guild_id), True)
+    if table == "guilds":
+        guild_settings_cache.pop(guild_id)
+        guild_config_cache.pop(guild_id)
+    elif table == "custom_commands":
+        custom_commands_cache.pop(guild_id)
+    elif table == "restricted_channels":
+        restricted_channels_cache.pop(guild_id)
+    elif table == "auto_roles":
+        auto_roles_cache.pop(guild_id)
+    elif table == "anime_gifs":
+        gif_index.clear()
+
+def _read_session(*keys):
+    """Session for a read-only lookup of keys
+    
+    Uses the replica unless this process wrote one of the keys within
+    DB_REPLICA_LAG_SECONDS, in which case the primary is read instead.
+    """
+    if ReadSession is Session or any(key in recent_writes for key in keys):
+        return Session()
+    return ReadSession()
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 class DatabaseHandler:
     """Handles database operations for the bot"""
     
@@ -55,23 +456,29 @@ class DatabaseHandler:
     def get_guild_settings(guild_id):
         """Get settings for a specific guild with caching for better performance"""
         # Check cache first
-        if guild_id in guild_settings_cache:
-            return guild_settings_cache[guild_id]
+        cached = guild_settings_cache.get(guild_id)
+        if cached is not None:
+            return cached
             
         if not Session:
             return None
             
-        session = Session()
+        session = _read_session(("guilds", guild_id))
         try:
             # First try to find existing guild settings
             guild = session.query(Guild).filter_by(id=guild_id).first()
             
             if not guild:
+                # Creating the row is a write, so it always happens on the primary
+                # (a lagging replica may also just not have it yet)
+                session.close()
+                session = Session()
                 try:
                     # Create new guild settings if they don't exist
                     guild = Guild(id=guild_id)
                     session.add(guild)
                     session.commit()
+                    _record_write("guilds", guild_id)
                 except Exception as e:
                     # If we get a duplicate key error, another process likely created it
                     # between our check and insert, so try to fetch it again
@@ -85,10 +492,10 @@ class DatabaseHandler:
                         print(f"Failed to create or retrieve guild settings for {guild_id}: {e}")
                         return None
                 
-            # Store in cache for faster future access
-            # Make a copy to prevent detached instance issues
-            guild_settings_cache[guild_id] = guild
-            return guild
+            # Store a detached snapshot in the cache for faster future access
+            settings = GuildSettings.from_row(guild)
+            guild_settings_cache.set(guild_id, settings)
+            return settings
         except Exception as e:
             print(f"Error getting guild settings: {e}")
             session.rollback()
@@ -104,26 +511,28 @@ class DatabaseHandler:
             
         session = Session()
         try:
-            guild = session.query(Guild).filter_by(id=guild_id).first()
-            if not guild:
-                guild = Guild(id=guild_id, **kwargs)
-                session.add(guild)
+            table = Guild.__table__
+            values = {key: value for key, value in kwargs.items() if key in table.c and key != "id"}
+            
+            if upsert_insert is not None and values:
+                # Insert-or-update in one statement and read the row back
+                stmt = upsert_insert(table).values(id=guild_id, **values)
+                stmt = stmt.on_conflict_do_update(index_elements=[table.c.id], set_=values)
+                guild = session.execute(stmt.returning(*table.c)).one()
             else:
-                for key, value in kwargs.items():
-                    if hasattr(guild, key):
+                guild = session.query(Guild).filter_by(id=guild_id).first()
+                if not guild:
+                    guild = Guild(id=guild_id, **values)
+                    session.add(guild)
+                else:
+                    for key, value in values.items():
                         setattr(guild, key, value)
             
             session.commit()
+            _record_write("guilds", guild_id)
             
-            # Update the cache with the new settings
-            if guild_id in guild_settings_cache:
-                # Update existing cache entry
-                for key, value in kwargs.items():
-                    if hasattr(guild_settings_cache[guild_id], key):
-                        setattr(guild_settings_cache[guild_id], key, value)
-            else:
-                # Add to cache
-                guild_settings_cache[guild_id] = guild
+            # Replace the cached snapshot with the new settings
+            guild_settings_cache.set(guild_id, GuildSettings.from_row(guild))
                 
             return True
         except Exception as e:
@@ -148,7 +557,8 @@ class DatabaseHandler:
                 
             # Get or create guild settings
             guild = session.query(Guild).filter_by(id=guild_id).first()
-            if not guild:
+            created_guild = guild is None
+            if created_guild:
                 guild = Guild(id=guild_id)
                 session.add(guild)
                 
@@ -156,6 +566,13 @@ class DatabaseHandler:
             auto_role = AutoRole(guild_id=guild_id, role_id=role_id)
             session.add(auto_role)
             session.commit()
+            if created_guild:
+                _record_write("guilds", guild_id)
+            _record_write("auto_roles", guild_id, role_id)
+            
+            roles = auto_roles_cache.get(guild_id)
+            if roles is not None:
+                auto_roles_cache.set(guild_id, roles + (role_id,))
             return True
         except Exception as e:
             print(f"Error adding auto-role: {e}")
@@ -164,6 +581,115 @@ class DatabaseHandler:
         finally:
             session.close()
     
+    @staticmethod
+    def get_auto_roles(guild_id):
+        """Get the auto-role ids for a guild as a tuple"""
+        cached = auto_roles_cache.get(guild_id)
+        if cached is not None:
+            return cached
+            
+        if not Session:
+            return ()
+            
+        session = _read_session(("auto_roles", guild_id))
+        try:
+            rows = session.query(AutoRole.role_id).filter_by(guild_id=guild_id).all()
+            roles = tuple(row.role_id for row in rows)
+            auto_roles_cache.set(guild_id, roles)
+            return roles
+        except Exception as e:
+            print(f"Error getting auto-roles: {e}")
+            return ()
+        finally:
+            session.close()
+    
+    @staticmethod
+    def get_restricted_channels(guild_id):
+        """Get the restricted channel ids for a guild as a frozenset"""
+        cached = restricted_channels_cache.get(guild_id)
+        if cached is not None:
+            return cached
+            
+        if not Session:
+            return frozenset()
+            
+        session = _read_session(("restricted_channels", guild_id))
+        try:
+            rows = session.query(RestrictedChannel.channel_id).filter_by(guild_id=guild_id).all()
+            channels = frozenset(row.channel_id for row in rows)
+            restricted_channels_cache.set(guild_id, channels)
+            return channels
+        except Exception as e:
+            print(f"Error getting restricted channels: {e}")
+            return frozenset()
+        finally:
+            session.close()
+    
+    @staticmethod
+    def warm_cache(guild_ids):
+        """Bulk-load every per-guild cache for guild_ids
+        
+        Runs one IN (...) query per table per chunk of WARM_CHUNK_SIZE guilds
+        and inserts all missing guild rows with a single statement, so the
+        first command in each guild after startup is a cache hit.
+        
+        Returns the number of guilds loaded.
+        """
+        if not Session:
+            return 0
+            
+        guild_ids = list(dict.fromkeys(guild_ids))
+        session = Session()
+        try:
+            guilds = {}
+            roles = {guild_id: [] for guild_id in guild_ids}
+            commands = {guild_id: {} for guild_id in guild_ids}
+            channels = {guild_id: set() for guild_id in guild_ids}
+            
+            for chunk in _chunks(guild_ids, WARM_CHUNK_SIZE):
+                for guild in session.query(Guild).filter(Guild.id.in_(chunk)):
+                    guilds[guild.id] = GuildSettings.from_row(guild)
+                for row in session.query(AutoRole.guild_id, AutoRole.role_id).filter(AutoRole.guild_id.in_(chunk)):
+                    roles[row.guild_id].append(row.role_id)
+                for row in session.query(CustomCommand).filter(CustomCommand.guild_id.in_(chunk)):
+                    commands[row.guild_id][row.name] = CustomCommandData.from_row(row)
+                for row in session.query(RestrictedChannel.guild_id, RestrictedChannel.channel_id).filter(
+                    RestrictedChannel.guild_id.in_(chunk)
+                ):
+                    channels[row.guild_id].add(row.channel_id)
+            
+            # Create rows for guilds the bot joined while the database didn't know them
+            missing = [{"id": guild_id} for guild_id in guild_ids if guild_id not in guilds]
+            if missing:
+                table = Guild.__table__
+                if upsert_insert is not None:
+                    stmt = upsert_insert(table).on_conflict_do_nothing(index_elements=[table.c.id])
+                else:
+                    stmt = sa.insert(table)
+                session.execute(stmt, missing)
+                session.commit()
+                for chunk in _chunks([row["id"] for row in missing], WARM_CHUNK_SIZE):
+                    for guild in session.query(Guild).filter(Guild.id.in_(chunk)):
+                        guilds[guild.id] = GuildSettings.from_row(guild)
+            
+            for guild_id in guild_ids:
+                if guild_id in guilds:
+                    guild_settings_cache.set(guild_id, guilds[guild_id])
+                auto_roles_cache.set(guild_id, tuple(roles[guild_id]))
+                custom_commands_cache.set(guild_id, MappingProxyType(commands[guild_id]))
+                restricted_channels_cache.set(guild_id, frozenset(channels[guild_id]))
+            
+            print(f"✅ Warmed caches for {len(guild_ids)} guilds ({len(missing)} new)")
+            return len(guild_ids)
+        except Exception as e:
+            print(f"Error warming caches: {e}")
+            session.rollback()
+            return 0
+        finally:
+            session.close()
+            # GIF commands aren't per guild, but load them up front as well
+            DatabaseHandler.load_gif_index()
+    
     @staticmethod
     def clear_cache(guild_id=None):
         """Clear caches to prevent stale data
@@ -171,32 +697,41 @@ class DatabaseHandler:
         Args:
             guild_id: If provided, only clear caches for this guild
         """
-        global guild_settings_cache, custom_commands_cache, restricted_channels_cache
-        
         if guild_id is None:
             # Clear all caches
-            guild_settings_cache = {}
-            custom_commands_cache = {}
-            restricted_channels_cache = {}
+            guild_settings_cache.clear()
+            custom_commands_cache.clear()
+            restricted_channels_cache.clear()
+            auto_roles_cache.clear()
+            guild_config_cache.clear()
+            gif_index.clear()
         else:
             # Clear only caches for the specified guild
             
             # Clear guild settings
-            if guild_id in guild_settings_cache:
-                del guild_settings_cache[guild_id]
+            guild_settings_cache.pop(guild_id)
                 
-            # Clear custom commands (keys are in format "{guild_id}_{command_name}")
-            to_remove = []
-            for key in custom_commands_cache:
-                if key.startswith(f"{guild_id}_"):
-                    to_remove.append(key)
-                    
-            for key in to_remove:
-                del custom_commands_cache[key]
+            # Clear custom commands (one entry per guild)
+            custom_commands_cache.pop(guild_id)
             
-            # Clear restricted channels
-            if guild_id in restricted_channels_cache:
-                del restricted_channels_cache[guild_id]
+            # Clear restricted channels and auto roles
+            restricted_channels_cache.pop(guild_id)
+            auto_roles_cache.pop(guild_id)
+            guild_config_cache.pop(guild_id)
+    
+    @staticmethod
+    def cache_stats():
+        """Return hit/miss/eviction counters for every cache"""
+        stats = {
+            cache.name: cache.stats()
+            for cache in (
+                guild_settings_cache, custom_commands_cache, restricted_channels_cache, auto_roles_cache,
+                guild_config_cache,
+            )
+        }
+        stats[gif_index.name] = {"size": len(gif_index), "loaded": gif_index.loaded}
+        stats["cache_bus"] = cache_bus.stats()
+        return stats
                 
     @staticmethod
     def add_custom_command(guild_id, command_name, command_response):
@@ -224,10 +759,15 @@ class DatabaseHandler:
                 session.add(command)
                 
             session.commit()
+            _record_write("custom_commands", guild_id, command_name)
             
-            # Update cache
-            cache_key = f"{guild_id}_{command_name}"
-            custom_commands_cache[cache_key] = command
+            # Update the guild's command index if it's loaded (copy-on-write so
+            # readers never see a half-updated dict)
+            commands = custom_commands_cache.get(guild_id)
+            if commands is not None:
+                updated = dict(commands)
+                updated[command_name] = CustomCommandData.from_row(command)
+                custom_commands_cache.set(guild_id, MappingProxyType(updated))
             
             return True
         except Exception as e:
@@ -238,32 +778,65 @@ class DatabaseHandler:
             session.close()
     
     @staticmethod
-    def get_custom_command(guild_id, command_name):
-        """Get a custom command for a guild with caching for better performance"""
-        # Create a cache key
-        cache_key = f"{guild_id}_{command_name}"
+    def get_custom_commands(guild_id):
+        """Get all custom commands for a guild as a read-only {name: command} mapping
         
+        The whole set is loaded in one query and cached per guild, so later
+        lookups (including misses) never touch the database.
+        """
         # Check cache first
-        if cache_key in custom_commands_cache:
-            return custom_commands_cache[cache_key]
+        cached = custom_commands_cache.get(guild_id)
+        if cached is not None:
+            return cached
             
         if not Session:
             return None
             
+        session = _read_session(("custom_commands", guild_id))
+        try:
+            rows = session.query(CustomCommand).filter_by(guild_id=guild_id).all()
+            commands = MappingProxyType({row.name: CustomCommandData.from_row(row) for row in rows})
+            custom_commands_cache.set(guild_id, commands)
+            return commands
+        except Exception as e:
+            print(f"Error getting custom commands: {e}")
+            return None
+        finally:
+            session.close()
+    
+    @staticmethod
+    def get_custom_command(guild_id, command_name):
+        """Get a custom command for a guild with caching for better performance"""
+        commands = DatabaseHandler.get_custom_commands(guild_id)
+        if commands is None:
+            return None
+        return commands.get(command_name)
+    
+    @staticmethod
+    def remove_custom_command(guild_id, command_name):
+        """Delete a custom command; returns True if it existed"""
+        if not Session:
+            return False
+            
         session = Session()
         try:
-            command = session.query(CustomCommand).filter_by(
+            deleted = session.query(CustomCommand).filter_by(
                 guild_id=guild_id, name=command_name
-            ).first()
+            ).delete(synchronize_session=False)
+            session.commit()
             
-            # Add to cache if found
-            if command:
-                custom_commands_cache[cache_key] = command
-                
-            return command
+            if deleted:
+                _record_write("custom_commands", guild_id, command_name)
+                commands = custom_commands_cache.get(guild_id)
+                if commands is not None:
+                    updated = dict(commands)
+                    updated.pop(command_name, None)
+                    custom_commands_cache.set(guild_id, MappingProxyType(updated))
+            return bool(deleted)
         except Exception as e:
-            print(f"Error getting custom command: {e}")
-            return None
+            print(f"Error removing custom command: {e}")
+            session.rollback()
+            return False
         finally:
             session.close()
     
@@ -284,6 +857,8 @@ class DatabaseHandler:
                 channel = RestrictedChannel(guild_id=guild_id, channel_id=channel_id)
                 session.add(channel)
                 session.commit()
+                _record_write("restricted_channels", guild_id, channel_id)
+                _cache_restricted_channel(guild_id, channel_id)
             
             return True
         except Exception as e:
@@ -311,6 +886,9 @@ class DatabaseHandler:
                 channel = RestrictedChannel(guild_id=guild_id, channel_id=channel_id)
                 session.add(channel)
                 session.flush()  # Generate ID for the new channel
+                created_channel = True
+            else:
+                created_channel = False
             
             # Check if user is already allowed
             existing = session.query(AllowedUser).filter_by(
@@ -322,6 +900,9 @@ class DatabaseHandler:
                 session.add(allowed_user)
             
             session.commit()
+            if created_channel:
+                _record_write("restricted_channels", guild_id, channel_id)
+                _cache_restricted_channel(guild_id, channel_id)
             return True
         except Exception as e:
             print(f"Error adding allowed user: {e}")
@@ -338,6 +919,18 @@ class DatabaseHandler:
             
         session = Session()
         try:
+            if upsert_insert is not None:
+                # Atomic increment: concurrent warnings can't lose updates
+                table = UserSettings.__table__
+                stmt = upsert_insert(table).values(guild_id=guild_id, user_id=user_id, warn_count=1)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.guild_id, table.c.user_id],
+                    set_={"warn_count": sa.func.coalesce(table.c.warn_count, 0) + 1},
+                )
+                warn_count = session.execute(stmt.returning(table.c.warn_count)).scalar_one()
+                session.commit()
+                return warn_count
+                
             # Find user settings
             user_settings = session.query(UserSettings).filter_by(
                 guild_id=guild_id, user_id=user_id
@@ -369,6 +962,11 @@ class DatabaseHandler:
             gif = AnimeGif(category=category, url=url)
             session.add(gif)
             session.commit()
+            _record_write("anime_gifs", key=category)
+            
+            # Keep the in-memory index current (if not loaded yet, the load picks it up)
+            if gif_index.loaded:
+                gif_index.add(category, url)
             return True
         except Exception as e:
             print(f"Error adding anime GIF: {e}")
@@ -378,27 +976,161 @@ class DatabaseHandler:
             session.close()
     
     @staticmethod
-    def get_random_gif(category=None):
-        """Get a random anime GIF, optionally filtered by category"""
+    def load_gif_index():
+        """Load every GIF URL into the in-memory category index (once)"""
+        if gif_index.loaded:
+            return True
         if not Session:
-            return None
+            return False
             
-        session = Session()
-        try:
-            if category:
-                query = session.query(AnimeGif).filter_by(category=category)
-            else:
-                query = session.query(AnimeGif)
+        with _gif_index_lock:
+            if gif_index.loaded:
+                return True
                 
-            # Order by random and get first result
-            gif = query.order_by(sa.func.random()).first()
-            return gif
-        except Exception as e:
-            print(f"Error getting random GIF: {e}")
+            session = _read_session(("anime_gifs", None))
+            try:
+                gif_index.load(session.query(AnimeGif.category, AnimeGif.url).all())
+                return True
+            except Exception as e:
+                print(f"Error loading GIF index: {e}")
+                return False
+            finally:
+                session.close()
+    
+    @staticmethod
+    def get_random_gif(category=None):
+        """Get a random anime GIF URL, optionally filtered by category
+        
+        Sampled from the in-memory index, so after the first load this makes
+        no database round trips.
+        """
+        if not DatabaseHandler.load_gif_index():
             return None
-        finally:
-            session.close()
+        return gif_index.sample(category)
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Run a blocking database call on the db executor and await the result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+class AsyncDatabaseHandler:
+    """Awaitable counterpart of DatabaseHandler for use inside the event loop
+    
+    Every method runs the matching DatabaseHandler call on the bounded
+    db executor, so a slow database round trip never blocks gateway
+    heartbeats or other guilds' commands.
+    """
+    
+    @staticmethod
+    async def get_guild_settings(guild_id):
+        """Get settings for a specific guild"""
+        # Cache hits don't need a thread hop
+        cached = guild_settings_cache.get(guild_id)
+        if cached is not None:
+            return cached
+        return await run_in_db_executor(DatabaseHandler.get_guild_settings, guild_id)
+    
+    @staticmethod
+    async def update_guild_settings(guild_id, **kwargs):
+        """Update guild settings with provided values"""
+        return await run_in_db_executor(DatabaseHandler.update_guild_settings, guild_id, **kwargs)
+    
+    @staticmethod
+    async def add_auto_role(guild_id, role_id):
+        """Add an auto-role for a guild"""
+        return await run_in_db_executor(DatabaseHandler.add_auto_role, guild_id, role_id)
+    
+    @staticmethod
+    async def get_auto_roles(guild_id):
+        """Get the auto-role ids for a guild as a tuple"""
+        cached = auto_roles_cache.get(guild_id)
+        if cached is not None:
+            return cached
+        return await run_in_db_executor(DatabaseHandler.get_auto_roles, guild_id)
+    
+    @staticmethod
+    async def get_restricted_channels(guild_id):
+        """Get the restricted channel ids for a guild as a frozenset"""
+        cached = restricted_channels_cache.get(guild_id)
+        if cached is not None:
+            return cached
+        return await run_in_db_executor(DatabaseHandler.get_restricted_channels, guild_id)
+    
+    @staticmethod
+    async def warm_cache(guild_ids):
+        """Bulk-load every per-guild cache for guild_ids"""
+        return await run_in_db_executor(DatabaseHandler.warm_cache, list(guild_ids))
+    
+    @staticmethod
+    def clear_cache(guild_id=None):
+        """Clear caches to prevent stale data (in-memory only, no I/O)"""
+        DatabaseHandler.clear_cache(guild_id)
+    
+    @staticmethod
+    def cache_stats():
+        """Return hit/miss/eviction counters for every cache"""
+        return DatabaseHandler.cache_stats()
+    
+    @staticmethod
+    async def add_custom_command(guild_id, command_name, command_response):
+        """Add or update a custom command for a guild"""
+        return await run_in_db_executor(
+            DatabaseHandler.add_custom_command, guild_id, command_name, command_response
+        )
+    
+    @staticmethod
+    async def get_custom_commands(guild_id):
+        """Get all custom commands for a guild as a read-only {name: command} mapping"""
+        cached = custom_commands_cache.get(guild_id)
+        if cached is not None:
+            return cached
+        return await run_in_db_executor(DatabaseHandler.get_custom_commands, guild_id)
+    
+    @staticmethod
+    async def get_custom_command(guild_id, command_name):
+        """Get a custom command for a guild"""
+        commands = await AsyncDatabaseHandler.get_custom_commands(guild_id)
+        if commands is None:
+            return None
+        return commands.get(command_name)
+    
+    @staticmethod
+    async def remove_custom_command(guild_id, command_name):
+        """Delete a custom command; returns True if it existed"""
+        return await run_in_db_executor(DatabaseHandler.remove_custom_command, guild_id, command_name)
+    
+    @staticmethod
+    async def restrict_channel(guild_id, channel_id):
+        """Add a channel to the restricted list"""
+        return await run_in_db_executor(DatabaseHandler.restrict_channel, guild_id, channel_id)
+    
+    @staticmethod
+    async def add_allowed_user(guild_id, channel_id, user_id):
+        """Allow a user to access a restricted channel"""
+        return await run_in_db_executor(DatabaseHandler.add_allowed_user, guild_id, channel_id, user_id)
+    
+    @staticmethod
+    async def increment_warning(guild_id, user_id):
+        """Increment warning count for a user in a guild"""
+        return await run_in_db_executor(DatabaseHandler.increment_warning, guild_id, user_id)
+    
+    @staticmethod
+    async def add_anime_gif(category, url):
+        """Add an anime GIF to the database"""
+        return await run_in_db_executor(DatabaseHandler.add_anime_gif, category, url)
+    
+    @staticmethod
+    async def get_random_gif(category=None):
+        """Get a random anime GIF URL, optionally filtered by category"""
+        # Once the index is loaded sampling is pure memory, no thread hop needed
+        if gif_index.loaded:
+            return gif_index.sample(category)
+        return await run_in_db_executor(DatabaseHandler.get_random_gif, category)
 
 # Initialize the database if possible
 if engine:
-    init_db()
\ No newline at end of file
+    init_db()
+
+# Listen for other processes' writes
+cache_bus.subscribe(_apply_invalidation)
+cache_bus.start()
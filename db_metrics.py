@@ -0,0 +1,211 @@
+"""
+Connection pool and statement timing metrics for the database engine
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds
+
+    Percentiles are reported as the upper bound of the bucket they fall in
+    (capped at the largest sample), which is plenty to tell a 2 ms lookup
+    from a 200 ms one.
+    """
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # Last bucket is +inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        index = 0
+        while index < len(self.BUCKETS_MS) and ms > self.BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, fraction):
+        """Upper bound (ms) of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                break
+        if index < len(self.BUCKETS_MS):
+            return round(min(float(self.BUCKETS_MS[index]), self.max_ms), 2)
+        return round(self.max_ms, 2)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max_ms, 2),
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection
+
+    Use DatabaseMetrics.pool_class() to get a subclass bound to a metrics object.
+    """
+
+    metrics = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.record_checkout_failure()
+            raise
+        if self.metrics is not None:
+            self.metrics.record_checkout(
+                (time.perf_counter() - start) * 1000, self.checkedout(), self.size()
+            )
+        return connection
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+class DatabaseMetrics:
+    """Pool saturation, checkout latency, per-statement timings and a slow-query log
+
+    Statements are keyed by their SQL text (parameters are never recorded),
+    with at most max_statements distinct keys; anything past that is counted
+    under "other".
+    """
+
+    def __init__(self, slow_query_ms=200, slow_log_size=50, max_statements=200):
+        self.slow_query_ms = slow_query_ms
+        self.max_statements = max_statements
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.engine = None
+        self._lock = threading.Lock()
+
+        self.checkout_ms = LatencyHistogram()
+        self.checkouts = 0
+        self.overflow_checkouts = 0  # Checkouts that needed a connection beyond pool_size
+        self.checkout_failures = 0   # Timeouts and connect errors
+        self.peak_in_use = 0
+
+        self.statement_ms = LatencyHistogram()
+        self.statements = {}  # SQL -> LatencyHistogram
+
+    def pool_class(self):
+        """QueuePool subclass reporting to these metrics, for create_engine(poolclass=...)"""
+        return type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"metrics": self})
+
+    def instrument(self, engine):
+        """Time every statement run through engine"""
+        self.engine = engine
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _start_timer(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["query_start"].pop()
+            self.record_statement(statement, (time.perf_counter() - started) * 1000)
+
+        @event.listens_for(engine, "handle_error")
+        def _drop_timer(context):
+            # Failed statements never reach after_cursor_execute
+            starts = context.connection.info.get("query_start") if context.connection else None
+            if starts:
+                starts.pop()
+
+    def record_checkout(self, wait_ms, in_use, pool_size):
+        with self._lock:
+            self.checkout_ms.observe(wait_ms)
+            self.checkouts += 1
+            if in_use > pool_size:
+                self.overflow_checkouts += 1
+            if in_use > self.peak_in_use:
+                self.peak_in_use = in_use
+
+    def record_checkout_failure(self):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def record_statement(self, statement, ms):
+        key = _WHITESPACE.sub(" ", statement).strip()[:300]
+        with self._lock:
+            self.statement_ms.observe(ms)
+            histogram = self.statements.get(key)
+            if histogram is None:
+                if len(self.statements) >= self.max_statements:
+                    key = "other"
+                histogram = self.statements.setdefault(key, LatencyHistogram())
+            histogram.observe(ms)
+            if ms >= self.slow_query_ms:
+                self.slow_queries.append({"at": time.time(), "ms": round(ms, 2), "statement": key})
+        if ms >= self.slow_query_ms:
+            logger.warning(f"Slow query ({ms:.1f}ms): {key}")
+
+    def top_statements(self, limit=5):
+        """Statements with the most total time spent, slowest first"""
+        with self._lock:
+            ranked = sorted(self.statements.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return [
+                {"statement": statement, "total_ms": round(histogram.total_ms, 2), **histogram.stats()}
+                for statement, histogram in ranked[:limit]
+            ]
+
+    def pool_status(self):
+        """Current pool occupancy plus checkout counters"""
+        pool = self.engine.pool if self.engine is not None else None
+        status = {}
+        if isinstance(pool, QueuePool):
+            status = {
+                "size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            }
+        with self._lock:
+            status.update({
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_ms": self.checkout_ms.stats(),
+            })
+        return status
+
+    def stats(self, top=5, slow=10):
+        """Everything above as one JSON-serializable dict"""
+        with self._lock:
+            statements = self.statement_ms.stats()
+            slow_queries = list(self.slow_queries)[-slow:]
+        return {
+            "pool": self.pool_status(),
+            "statements": statements,
+            "top_statements": self.top_statements(top),
+            "slow_query_ms": self.slow_query_ms,
+            "slow_queries": slow_queries,
+        }
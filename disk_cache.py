@@ -0,0 +1,199 @@
+"""
+Disk-backed second cache tier for API responses, so warm results survive restarts
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    etag TEXT,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at);
+"""
+
+# Bumped when the key format changes. Version 0 files keyed entries by full
+# URL, API keys included, so they are emptied rather than carried forward
+KEY_VERSION = 1
+
+class DiskCache:
+    """SQLite file of zlib-compressed JSON values, LRU-evicted to stay under max_bytes
+
+    Sits under the in-memory ResponseCache: values are written through on
+    every store and read back on a memory miss. Expiry uses wall-clock
+    time so entries stay valid across restarts. All SQLite work runs on one
+    background thread; errors are logged and treated as misses, so a broken
+    cache file never fails a command.
+    """
+
+    def __init__(self, path="data/http_cache.db", max_bytes=64 * 1024 * 1024, compress_level=6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.bytes = 0
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _connect(self):
+        # Only ever called on the executor thread
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < KEY_VERSION:
+                self._conn.execute("DELETE FROM entries")
+                self._conn.execute(f"PRAGMA user_version = {KEY_VERSION}")
+                self._conn.commit()
+                self._conn.execute("VACUUM")
+            self.bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return self._conn
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+    @staticmethod
+    def _category(key):
+        # Logged instead of the key itself, which may hold user queries
+        return key[0] if isinstance(key, tuple) and key else "cache"
+
+    def _get(self, key):
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at, stale_until, etag FROM entries WHERE key = ?", (self._key(key),)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at, stale_until, etag = row
+            if stale_until <= now:
+                self._delete(conn, key)
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, self._key(key)))
+            conn.commit()
+            raw = zlib.decompress(value)
+            self.hits += 1
+            return json.loads(raw), len(raw), expires_at - now, stale_until - expires_at, etag
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Disk cache read failed for a {self._category(key)} entry: {e}")
+            return None
+
+    def _delete(self, conn, key):
+        row = conn.execute("SELECT size FROM entries WHERE key = ?", (self._key(key),)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+            conn.commit()
+            self.bytes -= row[0]
+
+    def _set(self, key, value, ttl, etag, stale_ttl):
+        try:
+            conn = self._connect()
+            blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode(), self.compress_level)
+            if len(blob) > self.max_bytes:
+                return
+            now = time.time()
+            self._delete(conn, key)
+            conn.execute(
+                "INSERT INTO entries (key, value, size, expires_at, stale_until, etag, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(key), blob, len(blob), now + ttl, now + ttl + (stale_ttl if etag else 0), etag, now)
+            )
+            conn.commit()
+            self.bytes += len(blob)
+            if self.bytes > self.max_bytes:
+                self._evict(conn)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Disk cache write failed for a {self._category(key)} entry: {e}")
+
+    def _evict(self, conn):
+        # Expired entries go first, then least recently used, down to 90% of the cap
+        now = time.time()
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE stale_until <= ?", (now,)
+        ).fetchone()
+        conn.execute("DELETE FROM entries WHERE stale_until <= ?", (now,))
+        self.bytes -= size
+        self.evictions += count
+        target = self.max_bytes * 0.9
+        while self.bytes > target:
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 100").fetchall()
+            if not rows:
+                self.bytes = 0
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.bytes -= size
+                self.evictions += 1
+                if self.bytes <= target:
+                    break
+        conn.commit()
+
+    async def get(self, key):
+        """(value, size, ttl_left, stale_ttl, etag) for key, or None
+
+        ttl_left is negative for an expired entry kept for revalidation.
+        """
+        return await self._run(self._get, key)
+
+    def set(self, key, value, ttl, etag=None, stale_ttl=0):
+        """Queue value to be written; returns immediately"""
+        try:
+            self._executor.submit(self._set, key, value, ttl, etag, stale_ttl)
+        except RuntimeError:
+            pass  # Shut down
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self):
+        """Finish queued writes and close the file"""
+        try:
+            self._executor.submit(self._close)
+        except RuntimeError:
+            return
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
@@ -0,0 +1,195 @@
+"""
+One pooled aiohttp session shared by every cog
+"""
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+
+from circuit_breaker import CircuitBreakers
+from rate_limiter import RateLimiter
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Total request timeout per provider in seconds; override with HTTP_TIMEOUT_<PROVIDER>
+PROVIDER_TIMEOUTS = {
+    "default": 10.0,
+    "tenor": 4.0,
+    "giphy": 4.0,
+    "google": 8.0,
+    "youtube": 8.0,
+    "wikipedia": 6.0,
+    "urban": 6.0,
+    "github": 8.0,
+    "weather": 6.0,
+    "discord": 10.0,
+}
+
+USER_AGENT = "LxBot/1.0 (discord.py)"
+
+class SharedHTTPClient:
+    """Owns the bot-wide ClientSession and its connection pool
+
+    The session is created on first use inside the running loop (or by
+    start() from setup_hook), so cogs can hold a reference from __init__.
+    Connections are kept alive and DNS answers cached, so repeated calls
+    to the same API skip the DNS, TCP and TLS handshakes. Every request
+    also passes through a per-provider RateLimiter and CircuitBreaker; a
+    breaker opens when its provider keeps failing or its p95 latency goes
+    past half the provider's timeout.
+    """
+
+    def __init__(self, limit=None, limit_per_host=None, dns_ttl=300, keepalive_timeout=30, timeouts=None,
+                 rate_limiter=None):
+        self.limit = limit or int(os.getenv("HTTP_LIMIT", 100))
+        self.limit_per_host = limit_per_host or int(os.getenv("HTTP_LIMIT_PER_HOST", 10))
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeouts = dict(PROVIDER_TIMEOUTS)
+        for provider in self.timeouts:
+            value = os.getenv(f"HTTP_TIMEOUT_{provider.upper()}")
+            if value:
+                self.timeouts[provider] = float(value)
+        self.timeouts.update(timeouts or {})
+        self.rate_limiter = rate_limiter or RateLimiter(max_wait=float(os.getenv("HTTP_RATE_LIMIT_MAX_WAIT", 5.0)))
+        self.breakers = CircuitBreakers(
+            latency_thresholds={provider: total * 500 for provider, total in self.timeouts.items()}
+        )
+        self.inflight = SingleFlight()
+        self._session = None
+
+    @property
+    def session(self):
+        """The shared ClientSession (created on first access)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout("default"),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._session
+
+    async def start(self):
+        """Create the session now (call from setup_hook)"""
+        return self.session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def timeout(self, provider):
+        total = self.timeouts.get(provider, self.timeouts["default"])
+        return aiohttp.ClientTimeout(total=total, sock_connect=min(total, 5.0))
+
+    async def get_json(self, url, provider="default", headers=None, params=None, rate_key=None):
+        """GET url and return the decoded JSON body
+
+        rate_key is the API key or token the request is billed to; each
+        (provider, rate_key) pair gets its own rate limit and quota.
+
+        Identical requests already in flight are joined rather than sent
+        again, so concurrent callers share one response object and must
+        not modify it.
+
+        Raises circuit_breaker.CircuitOpen while the provider is considered
+        down, rate_limiter.RateLimitExceeded when the request would have to
+        wait too long for its provider, aiohttp.ClientResponseError for
+        non-2xx responses and aiohttp.ClientError / asyncio.TimeoutError for
+        transport failures.
+        """
+        data, etag = await self.get_json_conditional(url, None, provider, headers, params, rate_key)
+        return data
+
+    async def get_json_conditional(self, url, etag=None, provider="default", headers=None, params=None, rate_key=None):
+        """Like get_json, but returns (data, etag) and revalidates a cached copy
+
+        With an etag the request carries If-None-Match; a 304 Not Modified
+        returns (None, etag), meaning the caller's copy is still current.
+        """
+        key = (
+            provider, url, rate_key, etag,
+            tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())),
+        )
+        return await self.inflight.do(key, lambda: self._get_json(url, provider, headers, params, rate_key, etag))
+
+    async def _get_json(self, url, provider, headers, params, rate_key, etag):
+        if etag:
+            headers = dict(headers or {}, **{"If-None-Match": etag})
+        breaker = self.breakers.get(provider)
+        breaker.before_request()
+        try:
+            await self.rate_limiter.acquire(provider, rate_key)
+            started = time.monotonic()
+            try:
+                async with self.session.get(
+                    url, headers=headers, params=params, timeout=self.timeout(provider)
+                ) as response:
+                    self.rate_limiter.observe(provider, rate_key, response.status, response.headers)
+                    response.raise_for_status()
+                    if response.status == 304:
+                        data = None
+                    else:
+                        data = await response.json(content_type=None)
+                    etag = response.headers.get("ETag", etag)
+            except aiohttp.ClientResponseError as e:
+                # 4xx means the provider is up and answered; only 429/5xx count against it
+                if e.status >= 500 or e.status == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success((time.monotonic() - started) * 1000)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                breaker.record_failure()
+                raise
+            except asyncio.CancelledError:
+                # A hedged caller gave up on us; if we were already too slow, that's a failure
+                threshold = breaker.latency_threshold_ms
+                if threshold is not None and (time.monotonic() - started) * 1000 > threshold:
+                    breaker.record_failure()
+                raise
+            breaker.record_success((time.monotonic() - started) * 1000)
+            return data, etag
+        finally:
+            breaker.release()
+
+
+async def hedged(calls, delay, timeout, accept=bool):
+    """First accepted result from calls, hedging across them; None if none succeeds in time
+
+    calls are zero-argument coroutine functions in order of preference. The
+    next one starts when the previous has not answered within delay seconds,
+    or straight away when it fails or returns something accept() rejects.
+    Whatever is still running when a result is accepted, or when timeout
+    seconds have passed, is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    calls = list(calls)
+    pending = set()
+    try:
+        while True:
+            if calls:
+                pending.add(asyncio.ensure_future(calls.pop(0)()))
+            remaining = deadline - loop.time()
+            if not pending or remaining <= 0:
+                return None
+            done, pending = await asyncio.wait(
+                pending, timeout=min(delay, remaining) if calls else remaining,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None and accept(task.result()):
+                    return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
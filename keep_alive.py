@@ -1,7 +1,24 @@
-from flask import Flask
+from flask import Blueprint, Flask
 from threading import Thread
+from db_handler import db_metrics, read_db_metrics
+
+# Registered on every app that runs in the bot's process (this one and main.app),
+# so the metrics are the bot engine's
+status_blueprint = Blueprint("status", __name__)
+
+@status_blueprint.route('/status')
+def status():
+    payload = {
+        "status": "Bot is online!",
+        "message": "Discord bot is running smoothly.",
+        "database": db_metrics.stats(),
+    }
+    if read_db_metrics is not None:
+        payload["read_database"] = read_db_metrics.stats()
+    return payload
 
 app = Flask(__name__)
+app.register_blueprint(status_blueprint)
 
 @app.route('/')
 def home():
@@ -5,14 +5,19 @@ import sys
 import logging
 import threading
 import time
-from functools import lru_cache
+import datetime
 from discord.ext import commands
 from dotenv import load_dotenv
+from db_handler import AsyncDatabaseHandler, db_metrics, read_db_metrics
+from analytics import UsageRecorder, UsageRollup
+from disk_cache import DiskCache
+from http_client import SharedHTTPClient
+from models import CommandUsage
+from prefixes import MAX_PREFIX_LENGTH, forget_guild, get_prefix
 
 load_dotenv()
 
 TOKEN = os.getenv("DISCORD_TOKEN")  # From .env
-PREFIX = "lx"
 INTENTS = discord.Intents.default()
 INTENTS.message_content = True  # 🟢 Required
 
@@ -20,10 +25,11 @@ INTENTS.message_content = True  # 🟢 Required
 # Optional Flask app for keep_alive (e.g., Render, Replit)
 try:
     from flask import Flask
-    from database import init_app  # Ensure you have this
+    from database import init_app  # Shares db_handler's engine
+    from keep_alive import status_blueprint
     app = Flask(__name__)
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///bot.db"
     init_app(app)
+    app.register_blueprint(status_blueprint)  # gunicorn main:app serves the bot's metrics
 except ImportError:
     app = None
 
@@ -43,20 +49,75 @@ class OptimizedBot(commands.Bot):
         self._config_cache = {}
         self._config_timestamps = {}
         self._config_ttl = 300
+        self._caches_warmed = False
+        # One pooled HTTP session for every cog's API calls
+        self.http_client = SharedHTTPClient()
+        # API responses persisted under the cogs' in-memory caches, so a restart starts warm
+        self.disk_cache = DiskCache(
+            os.getenv("HTTP_CACHE_PATH", "data/http_cache.db"),
+            max_bytes=int(os.getenv("HTTP_CACHE_BYTES", 64 * 1024 * 1024))
+        )
+        # Analytics are buffered and written in batches off the command path
+        self.usage_recorder = UsageRecorder()
+        self.usage_rollup = UsageRollup(
+            raw_retention_days=int(os.getenv("USAGE_RETENTION_DAYS", 7)),
+            hourly_retention_days=int(os.getenv("USAGE_HOURLY_RETENTION_DAYS", 30)),
+            # Well past the recorder's flush delay, so late rows are still counted
+            grace_seconds=max(300, self.usage_recorder.flush_interval * 10)
+        )
 
-    @lru_cache(maxsize=128)
-    def get_cached_prefix(self, guild_id):
-        return PREFIX
+    async def setup_hook(self):
+        await self.http_client.start()
+        self.usage_recorder.start()
+
+    async def close(self):
+        await super().close()
+        await self.release_resources()
+
+    async def release_resources(self):
+        """Flush buffered usage rows and close the HTTP session and disk cache"""
+        await self.usage_recorder.stop()
+        await self.http_client.close()
+        await asyncio.to_thread(self.disk_cache.close)
 
     async def on_command(self, ctx):
         self.command_counter += 1
+        self.record_command_usage(ctx.author, ctx.guild, ctx.command.qualified_name)
+
+    async def on_app_command_completion(self, interaction, command):
+        self.record_command_usage(interaction.user, interaction.guild, command.qualified_name)
+
+    def record_command_usage(self, user, guild, command_name):
+        self.usage_recorder.record(
+            CommandUsage,
+            username=user.name,
+            user_id=user.id,
+            guild_id=guild.id if guild else None,
+            command_name=command_name[:50],
+            used_at=datetime.datetime.utcnow()
+        )
+
+    async def warm_caches(self):
+        # Bulk-load settings for every guild once, instead of a cold query per guild
+        if self._caches_warmed:
+            return
+        self._caches_warmed = True
+        start = time.perf_counter()
+        loaded = await AsyncDatabaseHandler.warm_cache(guild.id for guild in self.guilds)
+        logging.info(f"✅ Warmed caches for {loaded} guilds in {time.perf_counter() - start:.2f}s")
+
+    async def on_guild_join(self, guild):
+        await AsyncDatabaseHandler.warm_cache([guild.id])
+
+    async def on_guild_remove(self, guild):
+        forget_guild(guild.id)
 
     def get_uptime(self):
         return time.time() - self.start_time
 
 # Bot instance
 bot = OptimizedBot(
-    command_prefix=PREFIX,
+    command_prefix=get_prefix,
     intents=INTENTS,
     help_command=None
 )
@@ -65,6 +126,7 @@ bot = OptimizedBot(
 @bot.event
 async def on_ready():
     logging.info(f"✅ Bot is online as {bot.user}")
+    await bot.warm_caches()
     if should_sync_commands():
         try:
             await bot.tree.sync()
@@ -126,6 +188,8 @@ async def restart(ctx):
     await ctx.send("🔄 Restarting...")
     logging.info("Restarting bot...")
     bot._config_cache.clear()
+    # execv skips close(), so flush analytics and cache writes here
+    await bot.release_resources()
     os.execv(sys.executable, ["python"] + sys.argv)
 
 # Reload a cog
@@ -138,6 +202,84 @@ async def reload_cog(ctx, cog: str):
     except Exception as e:
         await ctx.send(f"❌ Error reloading `{cog}`:\n```{e}```")
 
+# Analytics recorder stats
+@bot.command(name="usagestats")
+@commands.is_owner()
+async def usage_stats(ctx):
+    stats = bot.usage_recorder.stats()
+    lines = "\n".join(f"{key}: {value}" for key, value in stats.items())
+    await ctx.send(f"📊 Usage recorder:\n```{lines}```")
+
+# Database pool and query timing stats
+@bot.command(name="dbstats")
+@commands.is_owner()
+async def db_stats(ctx):
+    stats = db_metrics.stats(top=3, slow=5)
+    pool, statements = stats["pool"], stats["statements"]
+    lines = [
+        f"pool: {pool.get('checked_out', 0)}/{pool.get('size', 0)} in use (+{pool.get('overflow', 0)} overflow, "
+        f"max {pool.get('max_overflow', 0)}), peak {pool['peak_in_use']}",
+        f"checkouts: {pool['checkouts']} ({pool['overflow_checkouts']} overflow, {pool['checkout_failures']} failed)",
+        "checkout wait ms: " + " ".join(f"{key}={value}" for key, value in pool["checkout_ms"].items()),
+        "statement ms: " + " ".join(f"{key}={value}" for key, value in statements.items()),
+        "",
+        "top statements by total time:",
+    ]
+    lines += [f"{item['total_ms']}ms x{item['count']} p95={item['p95']} {item['statement'][:120]}" for item in stats["top_statements"]]
+    if read_db_metrics is not None:
+        replica = read_db_metrics.pool_status()
+        lines += [
+            f"replica pool: {replica.get('checked_out', 0)}/{replica.get('size', 0)} in use, peak {replica['peak_in_use']}, "
+            f"{read_db_metrics.statement_ms.count} statements"
+        ]
+    lines += ["", f"slow queries (>= {stats['slow_query_ms']}ms):"]
+    lines += [f"{item['ms']}ms {item['statement'][:120]}" for item in stats["slow_queries"]] or ["none"]
+    body = "\n".join(lines)[:1900]
+    await ctx.send(f"🗄️ Database:\n```{body}```")
+
+@bot.command(name="ratelimits")
+@commands.is_owner()
+async def rate_limits(ctx):
+    stats = bot.http_client.rate_limiter.stats()
+    if not stats:
+        await ctx.send("No external API calls yet.")
+        return
+    lines = []
+    for name, bucket in sorted(stats.items()):
+        quota = f" quota {bucket['quota_used']}/{bucket['daily_quota']}" if bucket["daily_quota"] else ""
+        remote = f" remote {bucket['remote_remaining']} left" if bucket["remote_remaining"] is not None else ""
+        blocked = f" blocked {bucket['blocked_for']}s" if bucket["blocked_for"] else ""
+        lines.append(
+            f"{name}: {bucket['requests']} sent, {bucket['throttled']} queued, {bucket['shed']} shed, "
+            f"{bucket['tokens']} tokens @ {bucket['rate']}/s{quota}{remote}{blocked}"
+        )
+    lines += ["", "circuits:"]
+    lines += [
+        f"{provider}: {breaker['state']}, p95 {breaker['p95_ms']}ms, opened {breaker['opened']}x, "
+        f"{breaker['rejected']} rejected"
+        for provider, breaker in sorted(bot.http_client.breakers.stats().items())
+    ]
+    inflight = bot.http_client.inflight.stats()
+    lines += ["", f"coalesced: {inflight['coalesced']} joined {inflight['calls']} requests, {inflight['in_flight']} in flight"]
+    body = "\n".join(lines)[:1900]
+    await ctx.send(f"🚦 Rate limits:\n```{body}```")
+
+# Per-guild prefix
+@bot.command(name="setprefix")
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def set_prefix(ctx, prefix: str):
+    if not prefix.strip():
+        await ctx.send("❌ The prefix can't be blank.")
+        return
+    if len(prefix) > MAX_PREFIX_LENGTH:
+        await ctx.send(f"❌ Prefix can be at most {MAX_PREFIX_LENGTH} characters.")
+        return
+    if await AsyncDatabaseHandler.update_guild_settings(ctx.guild.id, prefix=prefix):
+        await ctx.send(f"✅ Prefix set to `{prefix}`")
+    else:
+        await ctx.send("❌ Failed to update the prefix.")
+
 # Uptime command
 @bot.command(name="uptime")
 async def uptime(ctx):
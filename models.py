@@ -1,8 +1,104 @@
-from sqlalchemy import Column, Integer, String, BigInteger, Boolean, Text, ForeignKey, Table
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+import json
+import datetime
+import logging
+from sqlalchemy import (
+    Column, Integer, String, BigInteger, Boolean, Text, DateTime, JSON, ARRAY, ForeignKey, Table, Index,
+    cast, event, func, update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import DeclarativeBase, Session, relationship, object_session
+from cache import TTLCache
 
-Base = declarative_base()
+logger = logging.getLogger(__name__)
+
+# Single declarative base shared by the bot (db_handler) and the Flask app (database)
+class Base(DeclarativeBase):
+    pass
+
+
+class GuildConfig:
+    """A guild's free-form JSON config
+    
+    Changed keys are tracked in dirty so only they are written back.
+    Settings that have a Guild column live only in that column and are
+    rejected here.
+    """
+    
+    # Guild columns; migrate_db() moves them out of older configs
+    COLUMN_KEYS = ("welcome_channel_id", "welcome_message", "log_channel_id", "anti_spam_enabled", "mention_limit")
+    
+    __slots__ = ("_values", "dirty")
+    
+    def __init__(self, values=None):
+        self._values = dict(values or {})
+        self.dirty = {}
+    
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+    
+    def __getitem__(self, key):
+        return self._values[key]
+    
+    def __contains__(self, key):
+        return key in self._values
+    
+    def __iter__(self):
+        return iter(self._values)
+    
+    def __len__(self):
+        return len(self._values)
+    
+    def items(self):
+        return self._values.items()
+    
+    def set(self, key, value):
+        """Set one key (None removes it) and mark it dirty"""
+        if key in self.COLUMN_KEYS:
+            raise ValueError(f"{key} is a Guild column, not a config key")
+        if value is None:
+            self._values.pop(key, None)
+        else:
+            self._values[key] = value
+        self.dirty[key] = value
+    
+    def update(self, changes):
+        for key, value in changes.items():
+            self.set(key, value)
+    
+    def as_dict(self):
+        return dict(self._values)
+    
+    def copy(self):
+        """A clean copy (no dirty keys) that can be changed independently"""
+        return GuildConfig(self._values)
+    
+    def __repr__(self):
+        return f'<GuildConfig {self._values!r}>'
+
+# Parsed configs per guild id, so reads never re-parse JSON. Only committed
+# configs are cached: writes are staged on the session until it commits
+guild_config_cache = TTLCache(maxsize=5000, ttl=600, name="guild_config")
+
+# Called as hook(guild_id) after a config write commits (db_handler uses
+# this to tell other processes)
+config_commit_hooks = []
+
+def _stage_config(session, guild_id, config):
+    session.info.setdefault("guild_configs", {})[guild_id] = config
+
+@event.listens_for(Session, "after_commit")
+def _publish_configs(session):
+    for guild_id, config in session.info.pop("guild_configs", {}).items():
+        config.dirty = {}
+        guild_config_cache.set(guild_id, config.copy())
+        for hook in config_commit_hooks:
+            hook(guild_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_configs(session):
+    # The caller's GuildConfig keeps its dirty keys, so saving again retries them
+    for guild_id in session.info.pop("guild_configs", {}):
+        guild_config_cache.pop(guild_id)
 
 class Guild(Base):
     """Represents server-specific settings and configurations"""
@@ -18,11 +114,92 @@ class Guild(Base):
     anti_spam_enabled = Column(Boolean, default=True)  # Whether anti-spam is enabled
     mention_limit = Column(Integer, default=3)  # Max mentions allowed per message
     
+    # Server metadata (merged in from the Flask app's former `guild` table)
+    name = Column(String(100), nullable=True)
+    icon_url = Column(String(255), nullable=True)
+    owner_id = Column(BigInteger, nullable=True)
+    member_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    joined_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Free-form configuration as JSON
+    config = Column(JSON().with_variant(JSONB, "postgresql"), nullable=True)  # Native JSONB on Postgres
+    
     # Relationships
     auto_roles = relationship("AutoRole", back_populates="guild", cascade="all, delete-orphan")
     custom_commands = relationship("CustomCommand", back_populates="guild", cascade="all, delete-orphan")
     restricted_channels = relationship("RestrictedChannel", back_populates="guild", cascade="all, delete-orphan")
     user_settings = relationship("UserSettings", back_populates="guild", cascade="all, delete-orphan")
+    warnings = relationship('Warning', back_populates='guild', cascade='all, delete-orphan')
+    command_usages = relationship('CommandUsage', back_populates='guild', cascade='all, delete-orphan')
+    
+    def get_config(self):
+        """Get configuration as a GuildConfig (parsed once, then cached per guild)
+        
+        Returns a private copy; changes take effect through save_config.
+        """
+        config = guild_config_cache.get(self.id)
+        if config is None:
+            values = self.config
+            if isinstance(values, str):
+                # Legacy rows stored as a JSON string inside the JSON column
+                try:
+                    values = json.loads(values)
+                except json.JSONDecodeError:
+                    logger.error(f"Failed to parse config JSON for guild {self.id}")
+                    values = {}
+            config = GuildConfig(values if isinstance(values, dict) else {})
+            guild_config_cache.set(self.id, config)
+        return config.copy()
+    
+    def set_config(self, config_dict):
+        """Replace the whole configuration from a dict; commit the session to persist"""
+        config = GuildConfig()
+        config.update(config_dict)
+        self.config = config.as_dict()
+        session = object_session(self)
+        if session is not None:
+            _stage_config(session, self.id, config)
+        else:
+            guild_config_cache.pop(self.id)
+    
+    def update_config(self, **changes):
+        """Change only the given keys (None removes a key); commit the session to persist"""
+        config = self.get_config()
+        config.update(changes)
+        self.save_config(config)
+    
+    def save_config(self, config):
+        """Write config's dirty keys with a single in-database JSON merge
+        
+        The cache is only updated once the session commits; after a rollback
+        config still has its dirty keys, so calling this again retries them.
+        """
+        if not config.dirty:
+            return
+        dirty = dict(config.dirty)
+        
+        patch = {key: value for key, value in dirty.items() if value is not None}
+        removed = [key for key, value in dirty.items() if value is None]
+        session = object_session(self)
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            merged = func.coalesce(Guild.config, cast({}, JSONB))
+            if removed:
+                merged = merged.op("-")(cast(removed, ARRAY(Text)))
+            merged = merged.op("||")(cast(patch, JSONB))
+        elif dialect == "sqlite":
+            # RFC 7396 merge patch: null values delete keys
+            merged = func.json_patch(func.coalesce(Guild.config, "{}"), json.dumps(dirty))
+        else:
+            merged = config.as_dict()
+        
+        session.execute(
+            update(Guild).where(Guild.id == self.id).values(config=merged),
+            execution_options={"synchronize_session": False}
+        )
+        session.expire(self, ["config"])
+        _stage_config(session, self.id, config)
     
     def __repr__(self):
         return f"<Guild id={self.id}>"
@@ -30,6 +207,9 @@ class Guild(Base):
 class AutoRole(Base):
     """Roles automatically assigned to new members"""
     __tablename__ = 'auto_roles'
+    __table_args__ = (
+        Index('uq_auto_roles_guild_role', 'guild_id', 'role_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     guild_id = Column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'))
@@ -43,6 +223,10 @@ class AutoRole(Base):
 class CustomCommand(Base):
     """Custom commands defined by server admins"""
     __tablename__ = 'custom_commands'
+    __table_args__ = (
+        # Also serves guild_id-only lookups (loading a guild's command set)
+        Index('uq_custom_commands_guild_name', 'guild_id', 'name', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     guild_id = Column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'))
@@ -57,6 +241,9 @@ class CustomCommand(Base):
 class RestrictedChannel(Base):
     """Voice channels with restricted access"""
     __tablename__ = 'restricted_channels'
+    __table_args__ = (
+        Index('uq_restricted_channels_guild_channel', 'guild_id', 'channel_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     guild_id = Column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'))
@@ -71,6 +258,9 @@ class RestrictedChannel(Base):
 class AllowedUser(Base):
     """Users allowed to access restricted voice channels"""
     __tablename__ = 'allowed_users'
+    __table_args__ = (
+        Index('uq_allowed_users_channel_user', 'channel_id', 'user_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     channel_id = Column(Integer, ForeignKey('restricted_channels.id', ondelete='CASCADE'))
@@ -84,6 +274,10 @@ class AllowedUser(Base):
 class UserSettings(Base):
     """User-specific settings within a guild"""
     __tablename__ = 'user_settings'
+    __table_args__ = (
+        # One row per member; also the conflict target for the warn-count upsert
+        Index('uq_user_settings_guild_user', 'guild_id', 'user_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     guild_id = Column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'))
@@ -105,4 +299,236 @@ class AnimeGif(Base):
     url = Column(String(255), nullable=False)  # URL to the GIF
     
     def __repr__(self):
-        return f"<AnimeGif id={self.id} category={self.category}>"
\ No newline at end of file
+        return f"<AnimeGif id={self.id} category={self.category}>"
+
+# User model
+class User(Base):
+    """Discord user data"""
+    __tablename__ = 'user'
+    
+    id = Column(BigInteger, primary_key=True)  # Discord user ID
+    username = Column(String(100), nullable=False)
+    discriminator = Column(String(10), nullable=True)  # May be None with new Discord username system
+    bot = Column(Boolean, default=False)
+    created_at = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Relationships
+    command_usages = relationship('CommandUsage', back_populates='user', cascade='all, delete-orphan')
+    gif_favorites = relationship('GifFavorite', back_populates='user', cascade='all, delete-orphan')
+    search_history = relationship('SearchHistory', back_populates='user', cascade='all, delete-orphan')
+    spotify_history = relationship('SpotifyHistory', back_populates='user', cascade='all, delete-orphan')
+    warnings = relationship('Warning', back_populates='user', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<User id={self.id} username={self.username}>'
+
+# Command Usage tracking
+class CommandUsage(Base):
+    """Track command usage"""
+    __tablename__ = 'command_usage'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('user.id'), nullable=False)
+    guild_id = Column(BigInteger, ForeignKey('guilds.id'), nullable=True)  # Nullable for DM commands
+    command_name = Column(String(50), nullable=False)
+    used_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Relationships
+    user = relationship('User', back_populates='command_usages')
+    guild = relationship('Guild', back_populates='command_usages')
+    
+    # Rollups and retention scan by time
+    __table_args__ = (Index('ix_command_usage_used_at', 'used_at'),)
+    
+    def __repr__(self):
+        return f'<CommandUsage id={self.id} command={self.command_name}>'
+
+# GIF Favorites
+class GifFavorite(Base):
+    """User's favorite GIFs"""
+    __tablename__ = 'gif_favorite'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('user.id'), nullable=False)
+    gif_id = Column(String(100), nullable=False)  # GIPHY ID
+    url = Column(String(255), nullable=False)
+    title = Column(String(255), nullable=True)
+    added_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Relationships
+    user = relationship('User', back_populates='gif_favorites')
+    
+    def __repr__(self):
+        return f'<GifFavorite id={self.id} gif_id={self.gif_id}>'
+
+# Search History
+class SearchHistory(Base):
+    """User's search history"""
+    __tablename__ = 'search_history'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('user.id'), nullable=False)
+    query = Column(String(255), nullable=False)
+    search_type = Column(String(20), nullable=False, default='web')  # web, image, etc.
+    searched_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Relationships
+    user = relationship('User', back_populates='search_history')
+    
+    __table_args__ = (Index('ix_search_history_searched_at', 'searched_at'),)
+    
+    def __repr__(self):
+        return f'<SearchHistory id={self.id} query={self.query}>'
+
+# Spotify History
+class SpotifyHistory(Base):
+    """User's Spotify search history"""
+    __tablename__ = 'spotify_history'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('user.id'), nullable=False)
+    item_id = Column(String(100), nullable=False)  # Spotify ID
+    item_type = Column(String(20), nullable=False)  # track, album, artist, playlist
+    name = Column(String(255), nullable=False)
+    url = Column(String(255), nullable=False)
+    searched_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Relationships
+    user = relationship('User', back_populates='spotify_history')
+    
+    def __repr__(self):
+        return f'<SpotifyHistory id={self.id} item_type={self.item_type} name={self.name}>'
+
+# Warning model for moderations
+class Warning(Base):
+    """User warnings"""
+    __tablename__ = 'warning'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('user.id'), nullable=False)
+    guild_id = Column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    moderator_id = Column(BigInteger, nullable=False)
+    reason = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    is_active = Column(Boolean, default=True)
+    
+    # Relationships
+    user = relationship('User', back_populates='warnings')
+    guild = relationship('Guild', back_populates='warnings')
+    
+    def __repr__(self):
+        return f'<Warning id={self.id} user_id={self.user_id} guild_id={self.guild_id}>'
+
+# Hourly command usage counters rolled up from CommandUsage
+class CommandUsageHourly(Base):
+    """Command usage counts per guild, per command, per hour"""
+    __tablename__ = 'command_usage_hourly'
+    
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)  # Start of the hour (UTC)
+    guild_id = Column(BigInteger, nullable=False)  # 0 for DM commands
+    command_name = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('uq_command_usage_hourly', 'bucket', 'guild_id', 'command_name', unique=True),
+        Index('ix_command_usage_hourly_guild', 'guild_id', 'bucket'),
+    )
+    
+    def __repr__(self):
+        return f'<CommandUsageHourly bucket={self.bucket} command={self.command_name} count={self.count}>'
+
+# Daily command usage counters rolled up from CommandUsageHourly
+class CommandUsageDaily(Base):
+    """Command usage counts per guild, per command, per day"""
+    __tablename__ = 'command_usage_daily'
+    
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)  # Midnight (UTC)
+    guild_id = Column(BigInteger, nullable=False)  # 0 for DM commands
+    command_name = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('uq_command_usage_daily', 'bucket', 'guild_id', 'command_name', unique=True),
+        Index('ix_command_usage_daily_guild', 'guild_id', 'bucket'),
+    )
+    
+    def __repr__(self):
+        return f'<CommandUsageDaily bucket={self.bucket} command={self.command_name} count={self.count}>'
+
+# Daily search counters rolled up from SearchHistory
+class SearchUsageDaily(Base):
+    """Search counts per search type, per day"""
+    __tablename__ = 'search_usage_daily'
+    
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)  # Midnight (UTC)
+    search_type = Column(String(20), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('uq_search_usage_daily', 'bucket', 'search_type', unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<SearchUsageDaily bucket={self.bucket} type={self.search_type} count={self.count}>'
+
+# Progress markers for the rollup jobs
+class RollupState(Base):
+    """Everything before watermark has been rolled up by the named job"""
+    __tablename__ = 'rollup_state'
+    
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<RollupState name={self.name} watermark={self.watermark}>'
+
+
+class Snapshot:
+    """Immutable, session-free copy of a row's column values
+
+    Safe to cache and share between threads: unlike ORM instances it never
+    lazy-loads, so it can't raise DetachedInstanceError after its session closes.
+    """
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a snapshot from an ORM instance or a result row"""
+        return cls(**{name: getattr(row, name) for name in cls.__slots__})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        fields = " ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__[:2])
+        return f"<{type(self).__name__} {fields}>"
+
+class GuildSettings(Snapshot):
+    """Cached, read-only view of a Guild row"""
+    __slots__ = (
+        "id", "prefix", "welcome_channel_id", "welcome_message", "log_channel_id",
+        "mod_role_id", "mute_role_id", "anti_spam_enabled", "mention_limit",
+    )
+
+class CustomCommandData(Snapshot):
+    """Cached, read-only view of a CustomCommand row"""
+    __slots__ = ("id", "guild_id", "name", "response")
@@ -0,0 +1,91 @@
+"""
+Per-guild command prefix resolution that never waits on the database
+"""
+import asyncio
+import functools
+import logging
+import os
+import re
+
+from cache import TTLCache
+from db_handler import CACHE_MAX_GUILDS, AsyncDatabaseHandler, guild_settings_cache
+
+DEFAULT_PREFIX = "lx"
+MAX_PREFIX_LENGTH = 10  # Guild.prefix is a String(10)
+
+# Off by default: "LX help" only runs a command when this is set
+PREFIX_IGNORE_CASE = os.getenv("PREFIX_IGNORE_CASE", "").lower() in ("1", "true", "yes", "on")
+
+# Last prefix seen per guild. Outlives the settings cache by far, so a TTL
+# lapse serves the known prefix while the settings reload
+_known_prefixes = TTLCache(CACHE_MAX_GUILDS, 24 * 60 * 60, name="known_prefixes")
+
+# Guild ids whose settings are being loaded in the background
+_pending_loads = {}
+
+@functools.lru_cache(maxsize=1024)
+def compile_prefix(prefix, ignore_case=False):
+    """Pattern matching prefix at the start of a message
+
+    Trailing whitespace in the stored prefix is ignored; discord.py skips the
+    whitespace between prefix and command itself.
+    """
+    return re.compile(re.escape(prefix.strip()), re.IGNORECASE if ignore_case else 0)
+
+def usable_prefix(prefix):
+    """prefix, or DEFAULT_PREFIX if it is empty or only whitespace"""
+    return prefix if prefix and prefix.strip() else DEFAULT_PREFIX
+
+def guild_prefix(guild_id):
+    """The guild's prefix, never waiting on the database
+
+    Read from the settings cache; when that misses (expired or invalidated)
+    the last known prefix is used while a background load refreshes it.
+    DEFAULT_PREFIX is used for a guild never seen before, and in place of a
+    blank stored prefix (which would match every message).
+    """
+    settings = guild_settings_cache.get(guild_id)
+    if settings is None:
+        _load_settings(guild_id)
+        return _known_prefixes.get(guild_id, DEFAULT_PREFIX)
+    prefix = usable_prefix(settings.prefix)
+    _known_prefixes.set(guild_id, prefix)
+    return prefix
+
+def forget_guild(guild_id):
+    """Drop the known prefix of a guild the bot has left"""
+    _known_prefixes.pop(guild_id)
+
+def match_prefix(guild_id, content):
+    """Return the prefix text content starts with for this guild (None for no match)"""
+    prefix = DEFAULT_PREFIX if guild_id is None else guild_prefix(guild_id)
+    match = compile_prefix(prefix, PREFIX_IGNORE_CASE).match(content)
+    return match.group(0) if match else None
+
+def get_prefix(bot, message):
+    """command_prefix callable for the bot"""
+    prefix = DEFAULT_PREFIX if message.guild is None else guild_prefix(message.guild.id)
+    match = compile_prefix(prefix, PREFIX_IGNORE_CASE).match(message.content)
+    # Hand discord.py the exact text that matched (e.g. "LX" for "lx"), or the
+    # guild's prefix so a non-matching message is rejected as usual
+    return match.group(0) if match else prefix
+
+def _load_settings(guild_id):
+    if guild_id in _pending_loads:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(AsyncDatabaseHandler.get_guild_settings(guild_id))
+    _pending_loads[guild_id] = task
+    task.add_done_callback(lambda done: _settings_loaded(guild_id, done))
+
+def _settings_loaded(guild_id, task):
+    _pending_loads.pop(guild_id, None)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logging.error(f"❌ Failed to load settings for guild {guild_id}: {task.exception()}")
+    elif task.result() is not None:
+        _known_prefixes.set(guild_id, usable_prefix(task.result().prefix))
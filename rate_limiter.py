@@ -0,0 +1,226 @@
+"""
+Outbound rate limiting for external APIs: one token bucket per provider and API key
+"""
+import asyncio
+import datetime
+import email.utils
+import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# provider -> (requests per second, burst, daily quota in units or None)
+# Quotas are the free tiers; override with RATE_LIMIT_<PROVIDER>_DAILY
+PROVIDER_LIMITS = {
+    "default": (5.0, 10, None),
+    "google": (1.0, 5, 100),           # Custom Search: 100 queries/day
+    "youtube": (1.0, 5, 10000),        # Data API: 10,000 units/day, a search costs 100
+    "wikipedia": (10.0, 20, None),
+    "urban": (5.0, 10, None),
+    "github": (10 / 60, 10, None),     # Unauthenticated search: 10/minute
+    "weather": (1.0, 10, None),        # 60/minute
+    "tenor": (5.0, 10, None),
+    "giphy": (100 / 3600, 10, None),   # Beta keys: 100/hour
+}
+
+# Units charged per request where a provider bills calls unequally
+REQUEST_COST = {
+    "youtube": 100,
+}
+
+# Back-off after a 429 that didn't say how long to wait
+DEFAULT_RETRY_AFTER = 5.0
+
+class RateLimitExceeded(Exception):
+    """Raised instead of sending a request that would exceed a provider's limits"""
+
+    def __init__(self, provider, retry_after):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} rate limit reached, try again in {max(1, round(retry_after))}s")
+
+
+def _seconds_until_utc_midnight(now=None):
+    now = now or datetime.datetime.utcnow()
+    tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+class TokenBucket:
+    """Token bucket with daily quota accounting and provider-supplied limits
+
+    Tokens may go negative: each waiting caller reserves the next token, so
+    queued requests are released in order at the bucket's rate.
+    """
+
+    def __init__(self, provider, rate, burst, daily_quota=None):
+        self.provider = provider
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.daily_quota = daily_quota
+        self.quota_used = 0
+        self.quota_day = datetime.datetime.utcnow().date()
+        self.blocked_until = 0.0   # monotonic time before which nothing is sent
+        self.header_rate = None    # Slower rate derived from X-RateLimit-* headers...
+        self.header_rate_until = 0.0  # ...valid until the provider's reset
+        self.remote_limit = None
+        self.remote_remaining = None
+
+        self.requests = 0
+        self.throttled = 0  # Requests that had to wait
+        self.shed = 0       # Requests refused
+
+    def _current_rate(self, now):
+        if self.header_rate is not None and now < self.header_rate_until:
+            return min(self.rate, self.header_rate)
+        self.header_rate = None
+        return self.rate
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self._current_rate(now))
+        self.updated = now
+
+    def reserve(self, cost=1, max_wait=5.0):
+        """Reserve one request; returns seconds to wait or raises RateLimitExceeded"""
+        now = time.monotonic()
+        today = datetime.datetime.utcnow().date()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.quota_used = 0
+        if self.daily_quota is not None and self.quota_used + cost > self.daily_quota:
+            self.shed += 1
+            raise RateLimitExceeded(self.provider, _seconds_until_utc_midnight())
+
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self._current_rate(now))
+        if wait > max_wait:
+            self.shed += 1
+            raise RateLimitExceeded(self.provider, wait)
+
+        self.tokens -= 1
+        self.quota_used += cost
+        self.requests += 1
+        if wait > 0:
+            self.throttled += 1
+        return wait
+
+    def observe(self, status, headers):
+        """Adjust to a response's Retry-After / X-RateLimit-* headers"""
+        now = time.monotonic()
+        retry_after = _parse_retry_after(headers.get("Retry-After"))
+        if status == 429 and retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
+        if retry_after is not None:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            logger.warning(f"{self.provider} asked us to back off for {retry_after:.1f}s")
+
+        remaining = _parse_number(headers.get("X-RateLimit-Remaining"))
+        reset = _parse_reset(headers.get("X-RateLimit-Reset"))
+        limit = _parse_number(headers.get("X-RateLimit-Limit"))
+        if limit is not None:
+            self.remote_limit = int(limit)
+        if remaining is None:
+            return
+        self.remote_remaining = int(remaining)
+        self._refill(now)
+        # Never plan on more requests than the provider says are left
+        self.tokens = min(self.tokens, remaining)
+        if reset is not None and reset > 0:
+            if remaining <= 0:
+                self.blocked_until = max(self.blocked_until, now + reset)
+            else:
+                # Spread what's left evenly over the rest of the window
+                self.header_rate = remaining / reset
+                self.header_rate_until = now + reset
+
+    def stats(self):
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "tokens": round(self.tokens, 2),
+            "rate": round(self._current_rate(now), 4),
+            "quota_used": self.quota_used,
+            "daily_quota": self.daily_quota,
+            "remote_remaining": self.remote_remaining,
+            "blocked_for": round(max(0.0, self.blocked_until - now), 1),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "shed": self.shed,
+        }
+
+
+def _parse_number(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _parse_retry_after(value):
+    """Retry-After is either delta-seconds or an HTTP date"""
+    if value is None:
+        return None
+    seconds = _parse_number(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+def _parse_reset(value):
+    """Seconds until the rate-limit window resets
+
+    Providers send either an epoch timestamp (GitHub) or a delta in seconds.
+    """
+    reset = _parse_number(value)
+    if reset is None:
+        return None
+    if reset > 1e9:
+        return max(0.0, reset - time.time())
+    return reset
+
+
+class RateLimiter:
+    """Token buckets keyed by (provider, API key), created on first use"""
+
+    def __init__(self, limits=None, max_wait=5.0):
+        self.limits = dict(PROVIDER_LIMITS)
+        self.limits.update(limits or {})
+        self.max_wait = max_wait
+        self._buckets = {}
+
+    def bucket(self, provider, key=None):
+        # Keys are fingerprinted so stats never expose them
+        fingerprint = hashlib.sha1(key.encode()).hexdigest()[:8] if key else None
+        bucket_id = (provider, fingerprint)
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            rate, burst, daily_quota = self.limits.get(provider, self.limits["default"])
+            override = os.getenv(f"RATE_LIMIT_{provider.upper()}_DAILY")
+            if override:
+                daily_quota = int(override) or None
+            bucket = self._buckets[bucket_id] = TokenBucket(provider, rate, burst, daily_quota)
+        return bucket
+
+    async def acquire(self, provider, key=None, max_wait=None):
+        """Wait for the provider's next slot, or raise RateLimitExceeded if it's too far off"""
+        wait = self.bucket(provider, key).reserve(
+            REQUEST_COST.get(provider, 1), self.max_wait if max_wait is None else max_wait
+        )
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def observe(self, provider, key, status, headers):
+        self.bucket(provider, key).observe(status, headers)
+
+    def stats(self):
+        return {
+            f"{provider}/{fingerprint}" if fingerprint else provider: bucket.stats()
+            for (provider, fingerprint), bucket in self._buckets.items()
+        }
@@ -0,0 +1,50 @@
+"""
+Coalesce identical concurrent calls into one
+"""
+import asyncio
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key
+    wait on that call and all get its result (or its exception)
+
+    The shared call keeps running while anyone is still waiting on it, so a
+    caller being cancelled doesn't fail the others; it is cancelled only
+    once every waiter has gone.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiter count]
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, call):
+        """Result of call() (a zero-argument coroutine function), shared by key"""
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(call())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _forget(self, key, task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here so an unawaited failure isn't logged
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "calls": self.calls, "coalesced": self.coalesced}
@@ -0,0 +1,25 @@
+import time
+from unittest import mock
+
+import pytest
+
+import cache_bus
+
+pytestmark = pytest.mark.skipif(cache_bus.redis is None, reason="redis package not installed")
+
+
+def test_redis_client_gets_short_timeouts():
+    with mock.patch.object(cache_bus.redis.Redis, "from_url") as from_url:
+        cache_bus.RedisBus("redis://example.invalid:6379", timeout=0.5)
+
+    from_url.assert_called_once_with("redis://example.invalid:6379", socket_connect_timeout=0.5, socket_timeout=0.5)
+
+
+def test_unreachable_redis_falls_back_to_local_bus_quickly():
+    started = time.monotonic()
+
+    # TEST-NET-1: never routed, so a connect attempt can only time out or be refused
+    bus = cache_bus.create_bus("redis://192.0.2.1:6379")
+
+    assert isinstance(bus, cache_bus.LocalBus)
+    assert time.monotonic() - started < cache_bus.REDIS_TIMEOUT * 2 + 1
@@ -0,0 +1,28 @@
+import asyncio
+from unittest import mock
+
+import discord
+import pytest
+from discord.ext import commands
+
+from cogs.custom_commands_cog import CustomCommandsCog
+
+
+def _bot_with_cog():
+    bot = commands.Bot(command_prefix="lx ", intents=discord.Intents.none())
+    asyncio.run(bot.add_cog(CustomCommandsCog(bot)))
+    return bot
+
+
+@pytest.mark.parametrize("name", ["customcommand list", "customcommand add", "customcommand remove"])
+def test_subcommands_reject_direct_messages(name):
+    bot = _bot_with_cog()
+    command = bot.get_command(name)
+    ctx = mock.MagicMock(bot=bot, guild=None)
+
+    with mock.patch("cogs.custom_commands_cog.AsyncDatabaseHandler") as handler:
+        with pytest.raises(commands.NoPrivateMessage):
+            asyncio.run(command.invoke(ctx))
+    handler.get_custom_commands.assert_not_called()
+    handler.add_custom_command.assert_not_called()
+    handler.remove_custom_command.assert_not_called()
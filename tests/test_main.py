@@ -0,0 +1,19 @@
+import asyncio
+from unittest import mock
+
+import main
+
+
+def test_restart_flushes_usage_rows_before_exec():
+    bot = main.bot
+    calls = []
+    ctx = mock.MagicMock()
+    ctx.send = mock.AsyncMock()
+
+    with mock.patch.object(bot.usage_recorder, "stop", mock.AsyncMock(side_effect=lambda: calls.append("usage"))), \
+            mock.patch.object(bot.http_client, "close", mock.AsyncMock(side_effect=lambda: calls.append("http"))), \
+            mock.patch.object(bot.disk_cache, "close", side_effect=lambda: calls.append("disk")), \
+            mock.patch.object(main.os, "execv", side_effect=lambda *args: calls.append("execv")):
+        asyncio.run(main.restart.callback(ctx))
+
+    assert calls == ["usage", "http", "disk", "execv"]
@@ -0,0 +1,43 @@
+import sqlalchemy as sa
+
+import db_handler
+from models import Guild
+
+guilds = Guild.__table__
+
+
+def _insert(guild_id, config):
+    with db_handler.engine.begin() as conn:
+        conn.execute(sa.insert(guilds).values(id=guild_id, config=config))
+
+
+def _row(guild_id):
+    with db_handler.engine.connect() as conn:
+        return conn.execute(sa.select(guilds).where(guilds.c.id == guild_id)).mappings().one()
+
+
+def test_non_default_legacy_values_replace_column_defaults():
+    _insert(201, {
+        "anti_spam_enabled": "false", "mention_limit": "5", "welcome_channel_id": "42",
+        "welcome_message": "hi", "theme": "dark",
+    })
+
+    db_handler.migrate_config_columns()
+
+    row = _row(201)
+    assert row["anti_spam_enabled"] is False
+    assert row["mention_limit"] == 5
+    assert row["welcome_channel_id"] == 42
+    assert row["welcome_message"] == "hi"
+    assert row["config"] == {"theme": "dark"}
+
+
+def test_unreadable_legacy_value_stays_in_config():
+    _insert(202, {"mention_limit": "lots", "anti_spam_enabled": False})
+
+    db_handler.migrate_config_columns()
+
+    row = _row(202)
+    assert row["mention_limit"] == 3
+    assert row["anti_spam_enabled"] is False
+    assert row["config"] == {"mention_limit": "lots"}
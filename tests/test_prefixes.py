@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import prefixes
+from db_handler import guild_settings_cache
+
+
+def _message(guild_id, content):
+    return SimpleNamespace(guild=SimpleNamespace(id=guild_id), content=content)
+
+
+def test_blank_stored_prefix_falls_back_to_default():
+    guild_settings_cache.set(101, SimpleNamespace(prefix="  "))
+
+    assert prefixes.guild_prefix(101) == prefixes.DEFAULT_PREFIX
+    assert prefixes.match_prefix(101, "hello there") is None
+    assert prefixes.get_prefix(None, _message(101, "hello there")) == prefixes.DEFAULT_PREFIX
+
+
+def test_known_prefix_survives_settings_expiry_until_guild_removed():
+    guild_settings_cache.set(102, SimpleNamespace(prefix="?"))
+    assert prefixes.guild_prefix(102) == "?"
+
+    guild_settings_cache.pop(102)
+    assert prefixes.guild_prefix(102) == "?"
+
+    prefixes.forget_guild(102)
+    assert prefixes.guild_prefix(102) == prefixes.DEFAULT_PREFIX
+
+
+def test_prefix_matching_is_case_sensitive_unless_enabled(monkeypatch):
+    guild_settings_cache.set(103, SimpleNamespace(prefix="lx "))
+    assert prefixes.match_prefix(103, "lx help") == "lx"
+    assert prefixes.match_prefix(103, "LX help") is None
+
+    monkeypatch.setattr(prefixes, "PREFIX_IGNORE_CASE", True)
+    assert prefixes.match_prefix(103, "LX help") == "LX"
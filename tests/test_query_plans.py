@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import query_plans
+
+
+def test_every_handler_lookup_uses_an_index():
+    results = query_plans.check()
+
+    covered = {description for description, statement, plan, scans in results}
+    assert covered == {description for description, call in query_plans.LOOKUPS}
+    scans = [(description, statement, plan) for description, statement, plan, found in results if found]
+    assert scans == []
+
+
+def test_guild_only_lookups_are_checked():
+    results = query_plans.check()
+
+    plans = {description: plan for description, statement, plan, scans in results if statement.startswith("SELECT")}
+    assert "auto_roles" in plans["get_auto_roles"]
+    assert "restricted_channels" in plans["get_restricted_channels"]
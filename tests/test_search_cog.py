@@ -0,0 +1,48 @@
+import asyncio
+from unittest import mock
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from cogs import search_cog
+from cogs.search_cog import SearchCog
+
+
+def _page(pageid, title, index, disambiguation=False):
+    page = {"pageid": pageid, "title": title, "index": index, "extract": f"About {title}", "fullurl": f"https://w/{pageid}"}
+    if disambiguation:
+        page["pageprops"] = {"disambiguation": ""}
+    return page
+
+
+def _cog():
+    return SearchCog(commands.Bot(command_prefix="lx ", intents=discord.Intents.none()))
+
+
+def test_exact_title_leads_but_keeps_other_candidates():
+    search_cog.wiki_pages.clear()
+    result = {"query": {"pages": [
+        _page(1, "Mercury (disambiguation)", 1, disambiguation=True),
+        _page(2, "Mercury (planet)", 2),
+        _page(3, "Mercury (element)", 3),
+    ]}}
+    cog = _cog()
+    cog.make_request = mock.AsyncMock(return_value=result)
+    search_cog.wiki_pages.set("mercury (element)", search_cog.parse_wikipedia_pages(result)[2])
+
+    pages = asyncio.run(cog.wikipedia_search("Mercury  (Element)"))
+
+    assert cog.make_request.await_count == 1
+    assert [page["pageid"] for page in pages] == [3, 2, 1]
+
+
+def test_slash_cooldown_gets_an_ephemeral_retry_message():
+    interaction = mock.MagicMock()
+    interaction.response.is_done.return_value = True
+    interaction.followup.send = mock.AsyncMock()
+    error = app_commands.CommandOnCooldown(app_commands.Cooldown(1, 5), 3.2)
+
+    asyncio.run(_cog().cog_app_command_error(interaction, error))
+
+    interaction.followup.send.assert_awaited_once_with("⏳ Slow down! Try again in 3s.", ephemeral=True)
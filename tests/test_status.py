@@ -0,0 +1,11 @@
+import main
+
+
+def test_main_app_serves_database_metrics():
+    response = main.app.test_client().get("/status")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "Bot is online!"
+    assert "pool" in body["database"]
+    assert "statements" in body["database"]